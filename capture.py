@@ -2,12 +2,12 @@ import os
 import atexit
 import threading
 import time
-from datetime import datetime
 
 from flask import (
     Flask,
     Response,
     abort,
+    jsonify,
     render_template_string,
     request,
     redirect,
@@ -15,238 +15,161 @@ from flask import (
     flash,
 )
 from werkzeug.utils import secure_filename
-import cv2
-from video_source import VideoSourceFactory
-
-BOUNDARY = os.getenv("FRAME_BOUNDARY", "frame")
-HOST = os.getenv("HOST", "0.0.0.0")
-PORT = int(os.getenv("PORT", 8080))
-TIMEOUT_MS = int(os.getenv("CAMERA_TIMEOUT_MS", 1000))
-FRAME_RATE = float(os.getenv("ACQUISITION_FRAME_RATE", "30.0"))
-MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", 3))
-UPLOAD_FOLDER = os.getenv(
-    "UPLOAD_FOLDER", "/Users/alexandrealvaro/dev/estudio/basler-camera-streamer/uploads"
-)
-ALLOWED_EXTENSIONS = {"mp4", "avi", "mov", "mkv", "webm"}
+from settings import Settings
 
-# Camera parameters
-ACQUISITION_MODE = os.getenv("ACQUISITION_MODE", "Continuous")
-GRAB_STRATEGY = os.getenv("GRAB_STRATEGY", "LatestImageOnly")
-ACQUISITION_FRAME_RATE_ENABLE = (
-    os.getenv("ACQUISITION_FRAME_RATE_ENABLE", "True").lower() == "true"
-)
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None  # transporte WebSocket opcional (pip install flask-sock)
 
-# Exposure and Gain
-EXPOSURE_AUTO = os.getenv("EXPOSURE_AUTO", "Continuous")
-EXPOSURE_TIME = float(os.getenv("EXPOSURE_TIME", "5000"))  # microseconds
-GAIN_AUTO = os.getenv("GAIN_AUTO", "Continuous")
-GAIN = float(os.getenv("GAIN", "0"))  # dB
 
-# Image adjustments
-IMAGE_CONTRAST = float(os.getenv("IMAGE_CONTRAST", "1.0"))
-IMAGE_BRIGHTNESS = int(os.getenv("IMAGE_BRIGHTNESS", "0"))
+class StreamerLauncher:
+    """Inicia o streamer numa thread em segundo plano.
 
+    Importar cv2/pypylon e abrir a câmera leva segundos; com isso fora do
+    caminho de startup o Flask já responde /healthz e /readyz enquanto a
+    fonte aquece.
+    """
 
-class FrameBuffer:
-    def __init__(self):
+    def __init__(self, settings):
+        self._settings = settings
+        self._created = time.perf_counter()
         self._lock = threading.Lock()
-        self._frame = None
-        self._event = threading.Event()
+        self._thread = None
+        self._streamer = None
+        self._mosaic = None
+        self._stage = "starting"
+        self._error = None
+        self._restart_pending = False
+        self._closed = False
+        self._timings = {
+            "app_created_s": None,
+            "modules_s": None,
+            "streamer_s": None,
+            "ready_s": None,
+        }
 
-    def put(self, frame):
+    def start(self):
+        self._thread = threading.Thread(target=self._warm_up, daemon=True)
+        self._thread.start()
+
+    def record_app_created(self, started):
         with self._lock:
-            self._frame = frame
-            self._event.set()
+            self._timings["app_created_s"] = time.perf_counter() - started
 
-    def get(self, timeout=1.0):
-        if self._event.wait(timeout):
+    def _warm_up(self):
+        try:
+            self._set_stage("loading_modules")
+            started = time.perf_counter()
+            from streamer import VideoStreamer
+
+            self._record("modules_s", started)
+
+            self._set_stage("opening_source")
+            started = time.perf_counter()
+            streamer = VideoStreamer(self._settings)
+            self._record("streamer_s", started)
+        except Exception as e:
+            print(f"Erro ao iniciar o streamer: {e}")
             with self._lock:
-                return self._frame
-        return None
-
-
-class ConnectionManager:
-    def __init__(self, max_connections):
-        self._max_connections = max_connections
-        self._count = 0
-        self._lock = threading.Lock()
+                self._stage = "failed"
+                self._error = str(e)
+            return
 
-    def can_connect(self):
         with self._lock:
-            return self._count < self._max_connections
+            if self._closed:
+                streamer.close()
+                return
+            self._streamer = streamer
+            self._stage = "running"
+            self._timings["ready_s"] = time.perf_counter() - self._created
+            restart_pending = self._restart_pending
+
+        # Upload recebido durante o aquecimento
+        if restart_pending:
+            streamer.restart_with_new_source()
+
+        # Fontes extras do mosaico abrem depois que o stream principal já
+        # está pronto
+        try:
+            from mosaic import MosaicStreamer
 
-    def acquire(self):
+            mosaic = MosaicStreamer(self._settings, streamer)
+        except Exception as e:
+            print(f"Erro ao iniciar o mosaico: {e}")
+            return
         with self._lock:
-            if self._count < self._max_connections:
-                self._count += 1
-                return True
-            return False
+            if self._closed:
+                mosaic.close()
+                return
+            self._mosaic = mosaic
 
-    def release(self):
+    def _set_stage(self, stage):
         with self._lock:
-            if self._count > 0:
-                self._count -= 1
+            self._stage = stage
 
-    def get_count(self):
+    def _record(self, name, started):
         with self._lock:
-            return self._count
-
+            self._timings[name] = time.perf_counter() - started
 
-class VideoController:
-    def __init__(self):
-        self._source = VideoSourceFactory.create_source()
-        self._running = True
-
-    def start_capture(self):
-        if self._source:
-            self._source.start_capture()
-
-    def is_available(self):
-        return self._source and self._source.is_available()
-
-    def capture_frame(self):
-        if not self.is_available():
-            return None
-
-        img = self._source.capture_frame()
-        if img is None:
-            return None
-
-        return self._encode_frame(img)
-
-    def _encode_frame(self, img):
-        # Apply image adjustments if needed
-        if IMAGE_CONTRAST != 1.0 or IMAGE_BRIGHTNESS != 0:
-            img = self._apply_image_adjustments(img)
-
-        ok, buf = cv2.imencode(".jpg", img)
-        if not ok:
-            return None
-
-        header = (
-            b"--" + BOUNDARY.encode() + b"\r\n" + b"Content-Type: image/jpeg\r\n\r\n"
-        )
-        return header + buf.tobytes() + b"\r\n"
-
-    def _apply_image_adjustments(self, img):
-        # Apply contrast and brightness: new_img = contrast * img + brightness
-        adjusted = cv2.convertScaleAbs(img, alpha=IMAGE_CONTRAST, beta=IMAGE_BRIGHTNESS)
-        return adjusted
-
-    def close(self):
-        self._running = False
-        if self._source:
-            self._source.close()
-
-    def get_source_type(self):
-        if not self._source:
-            return "None"
-        return type(self._source).__name__
-
-
-class StatusTracker:
-    def __init__(self):
-        self._start_time = datetime.now()
-        self._frame_count = 0
-        self._last_frame_time = time.time()
-        self._fps_samples = []
-        self._lock = threading.Lock()
-
-    def record_frame(self):
-        current_time = time.time()
+    def get(self):
         with self._lock:
-            self._frame_count += 1
-            frame_time = current_time - self._last_frame_time
-            self._fps_samples.append(frame_time)
-            self._last_frame_time = current_time
-
-            # Keep only last 30 samples
-            if len(self._fps_samples) > 30:
-                self._fps_samples.pop(0)
+            return self._streamer
 
-    def get_fps(self):
+    def get_mosaic(self):
         with self._lock:
-            if len(self._fps_samples) < 2:
-                return 0.0
-            return len(self._fps_samples) / sum(self._fps_samples)
+            return self._mosaic
 
-    def get_frame_count(self):
+    def restart_source(self):
         with self._lock:
-            return self._frame_count
+            streamer = self._streamer
+            if streamer is None:
+                self._restart_pending = True
+                return
+        streamer.restart_with_new_source()
 
-    def get_uptime(self):
-        return datetime.now() - self._start_time
-
-
-class VideoStreamer:
-    def __init__(self):
-        self._video_controller = VideoController()
-        self._buffer = FrameBuffer()
-        self._connections = ConnectionManager(MAX_CONNECTIONS)
-        self._status = StatusTracker()
-        self._capture_thread = None
-        self._start_capture_thread()
-
-    def _start_capture_thread(self):
-        self._capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
-        self._capture_thread.start()
-        self._video_controller.start_capture()
-
-    def _capture_loop(self):
-        while self._video_controller.is_available():
-            try:
-                frame = self._video_controller.capture_frame()
-                if frame:
-                    self._buffer.put(frame)
-                    self._status.record_frame()
-            except Exception as e:
-                print(f"Erro na captura: {e}")
-                time.sleep(0.1)
-
-    def can_connect(self):
-        return self._connections.can_connect()
-
-    def generate_frames(self):
-        if not self._connections.acquire():
-            return
+    def get_startup_stats(self):
+        with self._lock:
+            return self._round_timings(self._timings)
 
-        try:
-            while self._video_controller.is_available():
-                frame = self._buffer.get()
-                if frame:
-                    yield frame
-        except GeneratorExit:
-            pass
-        finally:
-            self._connections.release()
-
-    def get_status(self):
+    def _round_timings(self, timings):
         return {
-            "source_type": self._video_controller.get_source_type(),
-            "source_available": self._video_controller.is_available(),
-            "active_connections": self._connections.get_count(),
-            "max_connections": MAX_CONNECTIONS,
-            "fps": round(self._status.get_fps(), 2),
-            "total_frames": self._status.get_frame_count(),
-            "uptime": str(self._status.get_uptime()).split(".")[0],
-            "configured_fps": FRAME_RATE,
+            name: None if value is None else round(value, 3)
+            for name, value in timings.items()
         }
 
-    def restart_with_new_source(self):
-        # Para a captura atual
-        self._video_controller.close()
-
-        # Cria novo controller
-        self._video_controller = VideoController()
-
-        # Reinicia thread de captura
-        if self._capture_thread and self._capture_thread.is_alive():
-            self._capture_thread.join(timeout=1.0)
+    def get_readiness(self):
+        with self._lock:
+            streamer = self._streamer
+            stage = self._stage
+            error = self._error
+            startup = self._round_timings(self._timings)
+
+        ready = streamer is not None and streamer.is_source_available()
+        if streamer is not None:
+            stage = "ready" if ready else "waiting_for_source"
+            open_time = streamer.get_source_open_time()
+            startup["source_open_s"] = open_time and round(open_time, 3)
+        return {
+            "ready": ready,
+            "stage": stage,
+            "error": error,
+            "startup": startup,
+            "supervisor": streamer.get_supervisor_stats() if streamer else None,
+        }
 
-        self._start_capture_thread()
+    def get_uptime(self):
+        return time.perf_counter() - self._created
 
     def close(self):
-        self._video_controller.close()
+        with self._lock:
+            self._closed = True
+            streamer = self._streamer
+            mosaic = self._mosaic
+        if mosaic is not None:
+            mosaic.close()
+        if streamer is not None:
+            streamer.close()
 
 
 class StatusPageRenderer:
@@ -299,8 +222,13 @@ class StatusPageRenderer:
                     <p><strong>FPS Configurado:</strong> {status['configured_fps']}</p>
                     <p><strong>FPS Atual:</strong> {status['fps']}</p>
                     <p><strong>Total de Frames:</strong> {status['total_frames']}</p>
+                    <p><strong>Encoder JPEG:</strong> {status['encoder']['backend']} ({status['encoder']['encode_ms']} ms/frame, qualidade {status['encoder']['params']['quality']}, {status['encoder']['params']['subsampling']})</p>
+                    {self._render_encoder_benchmark(status['encoder']['benchmark_ms'])}
+                    {self._render_grab_stats(status)}
                 </div>
                 
+                {self._render_static_scene(status['static_scene'])}
+
                 <div class="status">
                     <h2>🔗 Conexões</h2>
                     <p><strong>Ativas:</strong> 
@@ -308,12 +236,18 @@ class StatusPageRenderer:
                             {status['active_connections']}/{status['max_connections']}
                         </span>
                     </p>
+                    {self._render_websocket(status['websocket'])}
                 </div>
                 
                 <div class="status">
                     <h2>⚙️ Sistema</h2>
                     <p><strong>Uptime:</strong> {status['uptime']}</p>
+                    <p><strong>Inicialização:</strong> pronto em {self._format_seconds(status['startup']['ready_s'])} s (fonte aberta em {self._format_seconds(status['source_open_s'])} s)</p>
+                    <p><strong>Reconexões:</strong> <span class="{'ok' if status['supervisor']['state'] == 'ok' else 'warning'}">{status['supervisor']['disconnects']}</span> (última recuperação: {status['supervisor']['last_recovery_s'] if status['supervisor']['last_recovery_s'] is not None else '-'} s, indisponível por {status['supervisor']['total_downtime_s']} s)</p>
+                    <p><strong>Buffers:</strong> {status['buffers']['pool_allocations']} alocações, {status['buffers']['pool_reuses']} reusos ({status['buffers']['pool_allocated_mb']} MB)</p>
+                    <p><strong>Cópias por frame:</strong> {status['buffers']['copies_per_frame']} ({status['buffers']['copied_kb_per_frame']} KB)</p>
                     <p><strong>Endpoint:</strong> <a href="/video_feed">/video_feed</a></p>
+                    {self._render_mosaic(status['mosaic'])}
                     <p><strong>Preview:</strong> <a href="/preview">🖼️ Ver Preview</a></p>
                 </div>
                 
@@ -323,6 +257,93 @@ class StatusPageRenderer:
         </html>
         """
 
+    def render_starting(self, readiness):
+        error = readiness["error"]
+        return f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <title>Basler Camera Streamer - Iniciando</title>
+            <meta charset="UTF-8">
+            <meta http-equiv="refresh" content="1">
+            <style>
+                body {{ font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }}
+                .container {{ max-width: 800px; margin: 0 auto; }}
+                .status {{ background: white; padding: 20px; border-radius: 8px; margin: 15px 0; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
+                .warning {{ color: #ffc107; font-weight: bold; }}
+                .error {{ color: #dc3545; font-weight: bold; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <h1>🎥 Video Streamer</h1>
+                <div class="status">
+                    <h2>⏳ Iniciando</h2>
+                    <p><strong>Etapa:</strong> <span class="{'error' if error else 'warning'}">{readiness['stage']}</span></p>
+                    {f'<p><strong>Erro:</strong> {error}</p>' if error else ''}
+                    <p><strong>Módulos carregados em:</strong> {self._format_seconds(readiness['startup']['modules_s'])} s</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """
+
+    def _format_seconds(self, value):
+        return "-" if value is None else f"{value:.2f}"
+
+    def _render_encoder_benchmark(self, benchmark_ms):
+        if not benchmark_ms:
+            return ""
+        results = ", ".join(f"{name}: {ms} ms" for name, ms in benchmark_ms.items())
+        return f"<p><strong>Benchmark de encoders:</strong> {results}</p>"
+
+    def _render_grab_stats(self, status):
+        grab = status["grab"]
+        if not grab:
+            return ""
+        return f"""
+                    <p><strong>Modo de Grab:</strong> {status['grab_mode']}</p>
+                    <p><strong>Frames Perdidos:</strong> {grab['frames_lost']} ({grab['buffer_underruns']} underruns de buffer)</p>
+                    <p><strong>Frames Descartados:</strong> {grab['frames_skipped']}</p>
+                    <p><strong>Falhas / Timeouts:</strong> {grab['grab_failures']} / {grab['grab_timeouts']}</p>
+        """
+
+    def _render_mosaic(self, mosaic):
+        if mosaic is None:
+            return ""
+        return (
+            f'<p><strong>Mosaico:</strong> <a href="/mosaic">/mosaic</a> '
+            f"({mosaic['grid']}, {mosaic['sources_open']}/{mosaic['tiles']} fontes, "
+            f"{mosaic['viewers']} viewers, {mosaic['encodes']} codificações, "
+            f"qualidade {mosaic['encode_params']['quality']}, "
+            f"{mosaic['encode_ms']} ms/frame)</p>"
+        )
+
+    def _render_websocket(self, websocket):
+        if not websocket["available"]:
+            return (
+                "<p><strong>WebSocket:</strong> indisponível (instale flask-sock)</p>"
+            )
+        return (
+            f"<p><strong>WebSocket:</strong> {websocket['clients']} clientes, "
+            f"{websocket['frames_sent']} frames enviados, "
+            f"{websocket['frames_skipped']} pulados por backpressure "
+            f"(máx. {websocket['max_in_flight']} sem confirmação)</p>"
+        )
+
+    def _render_static_scene(self, static_scene):
+        if not static_scene["enabled"]:
+            return ""
+        return f"""
+                <div class="status">
+                    <h2>🌙 Cena Estática</h2>
+                    <p><strong>Cena parada:</strong> {'Sim' if static_scene['static'] else 'Não'} (limiar: {static_scene['threshold']})</p>
+                    <p><strong>Frames suprimidos:</strong> {static_scene['frames_suppressed']} ({static_scene['keepalives_sent']} keep-alives)</p>
+                    <p><strong>Banda economizada:</strong> {static_scene['bandwidth_saved_mb']} MB</p>
+                    <p><strong>CPU economizada:</strong> {static_scene['cpu_saved_s']} s</p>
+                </div>
+        """
+
     def _get_source_status(self, source_type, is_available):
         if source_type == "VideoFileSource":
             return {
@@ -338,122 +359,242 @@ class StatusPageRenderer:
             return {"text": "❌ Nenhuma fonte disponível", "class": "error"}
 
 
-def allowed_file(filename):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+def create_app(settings=None):
+    started = time.perf_counter()
+    settings = settings or Settings()
 
+    # Garante que o diretório de upload existe
+    os.makedirs(settings.upload_folder, exist_ok=True)
 
-# Garante que o diretório de upload existe
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    launcher = StreamerLauncher(settings)
+    status_renderer = StatusPageRenderer()
 
-streamer = VideoStreamer()
-status_renderer = StatusPageRenderer()
-atexit.register(streamer.close)
+    app = Flask(__name__)
+    app.secret_key = settings.secret_key
+    app.config["SETTINGS"] = settings
+    app.extensions["streamer_launcher"] = launcher
+    sock = Sock(app) if Sock else None
 
-app = Flask(__name__)
-app.secret_key = "video_streamer_secret_key"
+    @app.route("/healthz")
+    def healthz():
+        return jsonify(status="ok", uptime_s=round(launcher.get_uptime(), 2))
 
+    @app.route("/readyz")
+    def readyz():
+        readiness = launcher.get_readiness()
+        return jsonify(readiness), 200 if readiness["ready"] else 503
 
-@app.route("/video_feed")
-def video_feed():
-    if not streamer.can_connect():
-        abort(503, "Limite de conexões atingido")
+    @app.route("/video_feed")
+    def video_feed():
+        streamer = launcher.get()
+        if streamer is None:
+            abort(503, "Fonte de vídeo iniciando")
 
-    return Response(
-        streamer.generate_frames(),
-        mimetype=f"multipart/x-mixed-replace; boundary={BOUNDARY}",
-    )
+        if not streamer.can_connect():
+            abort(503, "Limite de conexões atingido")
 
+        return Response(
+            streamer.generate_frames(),
+            mimetype=f"multipart/x-mixed-replace; boundary={settings.boundary}",
+        )
 
-@app.route("/upload", methods=["POST"])
-def upload_video():
-    if "video" not in request.files:
-        flash("Nenhum arquivo selecionado")
-        return redirect(url_for("home"))
-
-    file = request.files["video"]
-    if file.filename == "":
-        flash("Nenhum arquivo selecionado")
-        return redirect(url_for("home"))
+    @app.route("/mosaic")
+    def mosaic_feed():
+        streamer = launcher.get()
+        mosaic = launcher.get_mosaic()
+        if streamer is None or mosaic is None:
+            abort(503, "Mosaico iniciando")
 
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        video_path = os.path.join(UPLOAD_FOLDER, "current_video.mp4")
+        if not streamer.can_connect():
+            abort(503, "Limite de conexões atingido")
 
-        # Remove o vídeo anterior se existir
-        if os.path.exists(video_path):
-            os.remove(video_path)
+        return Response(
+            mosaic.generate_frames(),
+            mimetype=f"multipart/x-mixed-replace; boundary={settings.boundary}",
+        )
 
-        file.save(video_path)
-        flash("Vídeo enviado com sucesso! Reiniciando stream...")
+    if sock:
+
+        @sock.route("/ws/video")
+        def video_ws(ws):
+            # Cada mensagem binária: sequência (uint64) + timestamp de captura
+            # (float64, big-endian) + JPEG. O cliente responde com a sequência
+            # do frame renderizado
+            streamer = launcher.get()
+            if streamer is None or not streamer.can_connect():
+                ws.close(reason=1013, message="Fonte iniciando ou limite atingido")
+                return
+            streamer.serve_websocket(ws)
+
+    @app.route("/upload", methods=["POST"])
+    def upload_video():
+        if "video" not in request.files:
+            flash("Nenhum arquivo selecionado")
+            return redirect(url_for("home"))
+
+        file = request.files["video"]
+        if file.filename == "":
+            flash("Nenhum arquivo selecionado")
+            return redirect(url_for("home"))
+
+        if file and settings.allowed_file(file.filename):
+            filename = secure_filename(file.filename)
+            video_path = settings.uploaded_video_path
+
+            # Remove o vídeo anterior se existir
+            if os.path.exists(video_path):
+                os.remove(video_path)
+
+            file.save(video_path)
+            flash("Vídeo enviado com sucesso! Reiniciando stream...")
+
+            # Reinicia o streamer com nova fonte
+            launcher.restart_source()
+
+            return redirect(url_for("home"))
+        else:
+            flash("Formato de arquivo não suportado")
+            return redirect(url_for("home"))
 
-        # Reinicia o streamer com nova fonte
-        streamer.restart_with_new_source()
+    @app.route("/preview")
+    def preview():
+        return render_template_string(
+            """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <title>Video Stream Preview</title>
+            <meta charset="UTF-8">
+            <style>
+                body { 
+                    font-family: Arial, sans-serif; 
+                    margin: 20px; 
+                    background: #f5f5f5;
+                    text-align: center;
+                }
+                .container {
+                    max-width: 800px;
+                    margin: 0 auto;
+                    background: white;
+                    padding: 20px;
+                    border-radius: 8px;
+                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+                }
+                img {
+                    max-width: 100%;
+                    border: 2px solid #ddd;
+                    border-radius: 8px;
+                }
+                .btn {
+                    background: #007bff;
+                    color: white;
+                    padding: 10px 20px;
+                    border: none;
+                    border-radius: 4px;
+                    cursor: pointer;
+                    text-decoration: none;
+                    display: inline-block;
+                    margin: 10px;
+                }
+                .btn:hover { background: #0056b3; }
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <h1>🎥 Video Stream Preview</h1>
+                <img id="stream" alt="Video Stream">
+                <p id="transport"></p>
+                <a href="/" class="btn">← Voltar ao Status</a>
+            </div>
+            <script>
+                const img = document.getElementById("stream");
+                const info = document.getElementById("transport");
+
+                function useMjpeg() {
+                    img.onload = null;
+                    img.onerror = null;
+                    img.src = "/video_feed";
+                    info.textContent = "Transporte: MJPEG";
+                }
+
+                function useWebSocket() {
+                    const scheme = location.protocol === "https:" ? "wss" : "ws";
+                    const ws = new WebSocket(`${scheme}://${location.host}/ws/video`);
+                    ws.binaryType = "arraybuffer";
+                    let received = false;
+                    let shown = null;
+                    let loading = null;
+
+                    ws.onmessage = (event) => {
+                        received = true;
+                        const view = new DataView(event.data);
+                        const sequence = view.getBigUint64(0);
+                        const timestamp = view.getFloat64(8);
+                        const keepalive = view.getUint8(16) === 1;
+                        if (loading) URL.revokeObjectURL(loading);
+                        loading = URL.createObjectURL(
+                            new Blob([new Uint8Array(event.data, 17)], { type: "image/jpeg" })
+                        );
+                        img.onload = () => {
+                            if (shown) URL.revokeObjectURL(shown);
+                            shown = loading;
+                            loading = null;
+                            // Confirma só depois de renderizar: é o sinal de backpressure
+                            ws.send(sequence.toString());
+                            const latency = Math.round(Date.now() - timestamp * 1000);
+                            const state = keepalive ? "cena parada, keep-alive" : `latência ${latency} ms`;
+                            info.textContent = `Transporte: WebSocket (frame ${sequence}, ${state})`;
+                        };
+                        img.onerror = () => {
+                            // Frame que não decodifica também libera a vaga; sem
+                            // isso a janela fica cheia e o stream congela
+                            URL.revokeObjectURL(loading);
+                            loading = null;
+                            ws.send(sequence.toString());
+                        };
+                        img.src = loading;
+                    };
+
+                    ws.onclose = () => {
+                        if (received) {
+                            setTimeout(useWebSocket, 1000);
+                        } else {
+                            useMjpeg();
+                        }
+                    };
+                }
+
+                if ({{ websocket_enabled|tojson }} && window.WebSocket) {
+                    useWebSocket();
+                } else {
+                    useMjpeg();
+                }
+            </script>
+        </body>
+        </html>
+        """,
+            websocket_enabled=sock is not None,
+        )
 
-        return redirect(url_for("home"))
-    else:
-        flash("Formato de arquivo não suportado")
-        return redirect(url_for("home"))
-
-
-@app.route("/preview")
-def preview():
-    return """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Video Stream Preview</title>
-        <meta charset="UTF-8">
-        <style>
-            body { 
-                font-family: Arial, sans-serif; 
-                margin: 20px; 
-                background: #f5f5f5;
-                text-align: center;
-            }
-            .container {
-                max-width: 800px;
-                margin: 0 auto;
-                background: white;
-                padding: 20px;
-                border-radius: 8px;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            }
-            img {
-                max-width: 100%;
-                border: 2px solid #ddd;
-                border-radius: 8px;
-            }
-            .btn {
-                background: #007bff;
-                color: white;
-                padding: 10px 20px;
-                border: none;
-                border-radius: 4px;
-                cursor: pointer;
-                text-decoration: none;
-                display: inline-block;
-                margin: 10px;
-            }
-            .btn:hover { background: #0056b3; }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>🎥 Video Stream Preview</h1>
-            <img src="/video_feed" alt="Video Stream">
-            <br>
-            <a href="/" class="btn">← Voltar ao Status</a>
-        </div>
-    </body>
-    </html>
-    """
+    @app.route("/")
+    def home():
+        streamer = launcher.get()
+        if streamer is None:
+            return status_renderer.render_starting(launcher.get_readiness())
 
+        status = streamer.get_status()
+        status["startup"] = launcher.get_startup_stats()
+        status["websocket"]["available"] = sock is not None
+        mosaic = launcher.get_mosaic()
+        status["mosaic"] = mosaic.get_stats() if mosaic else None
+        return status_renderer.render(status)
 
-@app.route("/")
-def home():
-    status = streamer.get_status()
-    return status_renderer.render(status)
+    launcher.start()
+    atexit.register(launcher.close)
+    launcher.record_app_created(started)
+    return app
 
 
 if __name__ == "__main__":
-    app.run(host=HOST, port=PORT)
+    settings = Settings()
+    create_app(settings).run(host=settings.host, port=settings.port)
@@ -0,0 +1,225 @@
+import time
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+SUBSAMPLING_MODES = ("444", "422", "420")
+
+
+class EncodeParams:
+    def __init__(
+        self, quality=95, subsampling="420", optimize=False, restart_interval=0
+    ):
+        if subsampling not in SUBSAMPLING_MODES:
+            raise ValueError(f"Subsampling inválido: {subsampling}")
+        self.quality = quality
+        self.subsampling = subsampling
+        self.optimize = optimize
+        self.restart_interval = restart_interval
+
+    @classmethod
+    def from_settings(cls, settings, quality=None, subsampling=None):
+        # quality/subsampling sobrescrevem JPEG_* para um stream específico
+        return cls(
+            quality=settings.jpeg_quality if quality is None else quality,
+            subsampling=(
+                settings.jpeg_subsampling if subsampling is None else subsampling
+            ),
+            optimize=settings.jpeg_optimize,
+            restart_interval=settings.jpeg_restart_interval,
+        )
+
+    def to_dict(self):
+        return {
+            "quality": self.quality,
+            "subsampling": self.subsampling,
+            "optimize": self.optimize,
+            "restart_interval": self.restart_interval,
+        }
+
+
+class JpegEncoder(ABC):
+    name = None
+
+    def __init__(self, params):
+        self._params = params
+
+    @classmethod
+    def supports(cls, params):
+        return True
+
+    @abstractmethod
+    def encode(self, img):
+        # Retorna um objeto com buffer protocol (array numpy ou bytes) ou None
+        pass
+
+
+class OpenCVEncoder(JpegEncoder):
+    name = "opencv"
+
+    SAMPLING_FACTORS = {
+        "444": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+        "422": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+        "420": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+    }
+
+    def __init__(self, params):
+        super().__init__(params)
+        self._imwrite_params = [
+            cv2.IMWRITE_JPEG_QUALITY,
+            params.quality,
+            cv2.IMWRITE_JPEG_SAMPLING_FACTOR,
+            self.SAMPLING_FACTORS[params.subsampling],
+            cv2.IMWRITE_JPEG_OPTIMIZE,
+            int(params.optimize),
+            cv2.IMWRITE_JPEG_RST_INTERVAL,
+            params.restart_interval,
+        ]
+
+    def encode(self, img):
+        ok, buf = cv2.imencode(".jpg", img, self._imwrite_params)
+        return buf if ok else None
+
+
+class SimpleJpegEncoder(JpegEncoder):
+    name = "simplejpeg"
+
+    def __init__(self, params):
+        super().__init__(params)
+        try:
+            import simplejpeg
+        except ImportError:
+            raise RuntimeError("simplejpeg not available")
+        self._simplejpeg = simplejpeg
+
+    @classmethod
+    def supports(cls, params):
+        # libjpeg-turbo via simplejpeg não expõe optimize nem restart interval
+        return not params.optimize and params.restart_interval == 0
+
+    def encode(self, img):
+        return self._simplejpeg.encode_jpeg(
+            img,
+            quality=self._params.quality,
+            colorspace="BGR",
+            colorsubsampling=self._params.subsampling,
+        )
+
+
+class TurboJpegEncoder(JpegEncoder):
+    name = "turbojpeg"
+
+    def __init__(self, params):
+        super().__init__(params)
+        try:
+            import turbojpeg
+        except ImportError:
+            raise RuntimeError("PyTurboJPEG not available")
+
+        try:
+            self._jpeg = turbojpeg.TurboJPEG()
+        except (OSError, RuntimeError) as e:
+            raise RuntimeError(f"libturbojpeg not available: {e}")
+
+        self._pixel_format = turbojpeg.TJPF_BGR
+        self._subsample = {
+            "444": turbojpeg.TJSAMP_444,
+            "422": turbojpeg.TJSAMP_422,
+            "420": turbojpeg.TJSAMP_420,
+        }[params.subsampling]
+
+    @classmethod
+    def supports(cls, params):
+        return not params.optimize and params.restart_interval == 0
+
+    def encode(self, img):
+        return self._jpeg.encode(
+            img,
+            quality=self._params.quality,
+            pixel_format=self._pixel_format,
+            jpeg_subsample=self._subsample,
+        )
+
+
+ENCODERS = {
+    encoder.name: encoder
+    for encoder in (OpenCVEncoder, SimpleJpegEncoder, TurboJpegEncoder)
+}
+
+
+class EncoderSelector:
+    """Escolhe o backend JPEG para o host.
+
+    Com ``JPEG_ENCODER=auto`` cada backend disponível que suporta os
+    parâmetros configurados codifica um frame sintético algumas vezes e o
+    mais rápido (mediana) vence.
+    """
+
+    BENCHMARK_SHAPE = (720, 1280, 3)
+    BENCHMARK_ROUNDS = 10
+
+    def __init__(self, preferred, params):
+        self._preferred = preferred
+        self._params = params
+        self.benchmark_ms = {}
+        self.encoder_class = None
+
+    def select(self):
+        if self._preferred != "auto":
+            if self._preferred not in ENCODERS:
+                raise ValueError(f"Encoder JPEG desconhecido: {self._preferred}")
+            encoder_class = ENCODERS[self._preferred]
+            if not encoder_class.supports(self._params):
+                # Sem isso JPEG_OPTIMIZE/JPEG_RESTART_INTERVAL seriam ignorados
+                print(
+                    f"Encoder {self._preferred} não suporta JPEG_OPTIMIZE nem "
+                    f"JPEG_RESTART_INTERVAL; usando {OpenCVEncoder.name}"
+                )
+                encoder_class = OpenCVEncoder
+            try:
+                encoder_class(self._params)
+            except RuntimeError as e:
+                # Biblioteca ausente no host: não derruba o streamer
+                print(
+                    f"Encoder {self._preferred} indisponível: {e}; "
+                    f"usando {OpenCVEncoder.name}"
+                )
+                encoder_class = OpenCVEncoder
+            self.encoder_class = encoder_class
+            return self.encoder_class
+
+        frame = self._benchmark_frame()
+        for name, encoder_class in ENCODERS.items():
+            if not encoder_class.supports(self._params):
+                continue
+            try:
+                encoder = encoder_class(self._params)
+            except RuntimeError as e:
+                print(f"Encoder {name} indisponível: {e}")
+                continue
+            self.benchmark_ms[name] = round(self._measure(encoder, frame) * 1000, 2)
+
+        fastest = min(self.benchmark_ms, key=self.benchmark_ms.get)
+        self.encoder_class = ENCODERS[fastest]
+        return self.encoder_class
+
+    def _benchmark_frame(self):
+        # Gradiente com ruído: mais próximo de uma cena real que ruído puro
+        height, width, _ = self.BENCHMARK_SHAPE
+        rows, cols = np.indices((height, width))
+        base = ((rows + cols) * 255 // (height + width)).astype(np.uint8)
+        noise = np.random.default_rng(0).integers(0, 16, (height, width, 3))
+        return np.ascontiguousarray(
+            np.clip(base[..., None] + noise, 0, 255).astype(np.uint8)
+        )
+
+    def _measure(self, encoder, frame):
+        encoder.encode(frame)  # aquecimento
+        samples = []
+        for _ in range(self.BENCHMARK_ROUNDS):
+            started = time.perf_counter()
+            encoder.encode(frame)
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        return samples[len(samples) // 2]
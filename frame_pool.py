@@ -0,0 +1,66 @@
+import threading
+
+import numpy as np
+
+
+class FramePool:
+    """Anel de buffers numpy pré-alocados, reutilizados a cada frame.
+
+    Um slot só é realocado quando o formato do frame muda (ex.: troca de
+    resolução), então em regime permanente nenhuma alocação grande acontece.
+    O pool também contabiliza as cópias grandes feitas no caminho de captura
+    para que o custo por frame possa ser medido.
+    """
+
+    def __init__(self, slots=4):
+        self._slots = [None] * slots
+        self._index = 0
+        self._lock = threading.Lock()
+        self._allocations = 0
+        self._allocated_bytes = 0
+        self._reuses = 0
+        self._frames = 0
+        self._copies = 0
+        self._copied_bytes = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        with self._lock:
+            index = self._index
+            self._index = (self._index + 1) % len(self._slots)
+
+            buf = self._slots[index]
+            if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+                buf = np.empty(shape, dtype=dtype)
+                self._slots[index] = buf
+                self._allocations += 1
+                self._allocated_bytes += buf.nbytes
+            else:
+                self._reuses += 1
+            return buf
+
+    def record_allocation(self, nbytes):
+        # Alocações feitas fora do anel (buffers intermediários, conversor)
+        with self._lock:
+            self._allocations += 1
+            self._allocated_bytes += nbytes
+
+    def record_copy(self, nbytes):
+        with self._lock:
+            self._copies += 1
+            self._copied_bytes += nbytes
+
+    def record_frame(self):
+        with self._lock:
+            self._frames += 1
+
+    def get_stats(self):
+        with self._lock:
+            frames = max(self._frames, 1)
+            return {
+                "pool_slots": len(self._slots),
+                "pool_allocations": self._allocations,
+                "pool_allocated_mb": round(self._allocated_bytes / 1_000_000, 2),
+                "pool_reuses": self._reuses,
+                "copies_per_frame": round(self._copies / frames, 2),
+                "copied_kb_per_frame": round(self._copied_bytes / frames / 1000, 1),
+            }
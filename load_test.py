@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Gerador de carga MJPEG: abre N conexões simultâneas em /video_feed,
+aumentando em degraus, e mede a entrega de frames de cada uma.
+
+Exemplo:
+    python load_test.py --url http://localhost:8080/video_feed --max-connections 12
+
+O resultado é um resumo JSON por degrau e o ponto em que a entrega degrada.
+O servidor deve rodar com STATIC_SCENE_THRESHOLD=0: com a detecção de cena
+estática ativa, uma cena parada só envia keep-alives e o fps medido não
+reflete a capacidade do servidor.
+"""
+
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+from settings import Settings
+
+
+class MultipartFrameCounter:
+    """Conta as partes de um stream multipart/x-mixed-replace.
+
+    O servidor não envia Content-Length por parte, então cada ocorrência do
+    boundary marca o início de um frame. Um pedaço do fim de cada leitura é
+    mantido para achar boundaries que ficaram divididos entre dois reads.
+    """
+
+    def __init__(self, boundary):
+        self._marker = b"--" + boundary.encode()
+        self._tail = b""
+        self._frame_bytes = 0
+        self._started = False
+
+    def feed(self, data):
+        # Retorna o tamanho de cada frame completado por este pedaço do stream
+        completed = []
+        buf = self._tail + data
+        start = 0
+        while True:
+            index = buf.find(self._marker, start)
+            if index < 0:
+                break
+            if self._started:
+                completed.append(self._frame_bytes + index - start)
+            self._started = True
+            self._frame_bytes = 0
+            start = index + len(self._marker)
+
+        keep = min(len(self._marker) - 1, len(buf) - start)
+        self._frame_bytes += len(buf) - start - keep
+        self._tail = buf[len(buf) - keep :] if keep else b""
+        return completed
+
+
+class StreamClient:
+    def __init__(self, url, boundary, timeout):
+        self._url = urlparse(url)
+        self._boundary = boundary
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._frames = []  # (timestamp, bytes)
+        self.status = "connecting"
+        self.error = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        connection = http.client.HTTPConnection(
+            self._url.hostname, self._url.port or 80, timeout=self._timeout
+        )
+        try:
+            connection.request("GET", self._url.path or "/")
+            response = connection.getresponse()
+            if response.status != 200:
+                self.status = "rejected"
+                self.error = f"HTTP {response.status}"
+                return
+
+            self.status = "streaming"
+            counter = MultipartFrameCounter(self._boundary)
+            while not self._stop.is_set():
+                data = response.read1(65536)
+                if not data:
+                    self.status = "closed"
+                    return
+                now = time.time()
+                sizes = counter.feed(data)
+                if sizes:
+                    with self._lock:
+                        self._frames.extend((now, size) for size in sizes)
+        except Exception as e:
+            if not self._stop.is_set():
+                self.status = "failed"
+                self.error = str(e)
+        finally:
+            connection.close()
+
+    def frames_between(self, start, end):
+        with self._lock:
+            return [frame for frame in self._frames if start <= frame[0] < end]
+
+
+class LoadTest:
+    # Stall padrão: alguns intervalos medianos do baseline sem frame novo
+    STALL_GAP_FACTOR = 4
+    MIN_STALL_THRESHOLD = 0.1  # s
+    FALLBACK_STALL_THRESHOLD = 0.5  # s, quando o baseline não tem frames
+
+    def __init__(self, args):
+        self._args = args
+        self._clients = []
+        self._stall_threshold = args.stall_threshold
+
+    def run(self):
+        args = self._args
+        steps = []
+        baseline_fps = None
+        max_sustainable = 0
+        degraded_at = None
+        static_scene = False
+
+        try:
+            while len(self._clients) < args.max_connections:
+                self._add_clients(
+                    min(args.step, args.max_connections - len(self._clients))
+                )
+                time.sleep(args.warmup)
+
+                window_start = time.time()
+                time.sleep(args.step_duration)
+                window_end = time.time()
+
+                if self._stall_threshold is None:
+                    self._stall_threshold = self._baseline_stall_threshold(
+                        window_start, window_end
+                    )
+                step = self._measure_step(window_start, window_end)
+                if baseline_fps is None:
+                    baseline_fps = step["fps"]["mean"]
+                    if self._looks_like_keepalives(baseline_fps):
+                        static_scene = True
+                        steps.append(step)
+                        print(
+                            f"Só {baseline_fps} fps com uma conexão: o servidor "
+                            "parece estar enviando apenas keep-alives de cena "
+                            "estática. Rode-o com STATIC_SCENE_THRESHOLD=0.",
+                            file=sys.stderr,
+                        )
+                        break
+                self._evaluate_step(step, baseline_fps)
+                steps.append(step)
+                print(
+                    f"{step['connections']} conexões: "
+                    f"{step['fps']['mean']} fps/conexão, "
+                    f"{'degradado' if step['degraded'] else 'ok'}",
+                    file=sys.stderr,
+                )
+
+                if step["degraded"]:
+                    degraded_at = step["connections"]
+                    if not args.keep_going:
+                        break
+                elif degraded_at is None:
+                    max_sustainable = step["connections"]
+        finally:
+            for client in self._clients:
+                client.stop()
+            for client in self._clients:
+                client.join(timeout=1.0)
+
+        return {
+            "url": args.url,
+            "boundary": args.boundary,
+            "config": {
+                "step": args.step,
+                "max_connections": args.max_connections,
+                "step_duration_s": args.step_duration,
+                "warmup_s": args.warmup,
+                "stall_threshold_s": self._stall_threshold,
+                "keepalive_interval_s": args.keepalive_interval,
+                "min_fps_ratio": args.min_fps_ratio,
+            },
+            "baseline_fps": baseline_fps,
+            "static_scene_suspected": static_scene,
+            "max_sustainable_connections": max_sustainable,
+            "degraded_at": degraded_at,
+            "steps": steps,
+        }
+
+    def _looks_like_keepalives(self, fps):
+        # Com a cena parada o servidor manda ~1 frame por keep-alive interval
+        return fps > 0 and fps <= 1.5 / self._args.keepalive_interval
+
+    def _baseline_stall_threshold(self, start, end):
+        gaps = []
+        for client in self._clients:
+            times = [timestamp for timestamp, _ in client.frames_between(start, end)]
+            gaps.extend(b - a for a, b in zip(times, times[1:]))
+        if not gaps:
+            return self.FALLBACK_STALL_THRESHOLD
+        gaps.sort()
+        median = gaps[len(gaps) // 2]
+        return round(max(median * self.STALL_GAP_FACTOR, self.MIN_STALL_THRESHOLD), 3)
+
+    def _add_clients(self, count):
+        for _ in range(count):
+            client = StreamClient(self._args.url, self._args.boundary, timeout=10)
+            client.start()
+            self._clients.append(client)
+
+    def _measure_step(self, start, end):
+        duration = end - start
+        per_connection = []
+        statuses = {}
+        for client in self._clients:
+            statuses[client.status] = statuses.get(client.status, 0) + 1
+            if client.status != "streaming":
+                continue
+            per_connection.append(self._measure_client(client, start, end, duration))
+
+        return {
+            "connections": len(self._clients),
+            "streaming": statuses.get("streaming", 0),
+            "rejected": statuses.get("rejected", 0),
+            "failed": statuses.get("failed", 0) + statuses.get("closed", 0),
+            "errors": sorted(
+                {client.error for client in self._clients if client.error}
+            ),
+            "fps": self._summary([c["fps"] for c in per_connection]),
+            "bytes_per_s": self._summary([c["bytes_per_s"] for c in per_connection]),
+            "total_bytes_per_s": round(sum(c["bytes_per_s"] for c in per_connection)),
+            "gap_ms": {
+                "mean": self._summary([c["gap_mean_ms"] for c in per_connection])[
+                    "mean"
+                ],
+                "p95": max((c["gap_p95_ms"] for c in per_connection), default=0.0),
+                "max": max((c["gap_max_ms"] for c in per_connection), default=0.0),
+            },
+            "stall_s": round(sum(c["stall_s"] for c in per_connection), 3),
+            "stall_ratio": round(
+                sum(c["stall_s"] for c in per_connection)
+                / (duration * max(len(per_connection), 1)),
+                4,
+            ),
+        }
+
+    def _measure_client(self, client, start, end, duration):
+        frames = client.frames_between(start, end)
+        times = [start] + [timestamp for timestamp, _ in frames] + [end]
+        gaps = sorted(b - a for a, b in zip(times, times[1:]))
+        stall = sum(gap for gap in gaps if gap > self._stall_threshold)
+        return {
+            "fps": len(frames) / duration,
+            "bytes_per_s": sum(size for _, size in frames) / duration,
+            "gap_mean_ms": sum(gaps) / len(gaps) * 1000,
+            "gap_p95_ms": round(gaps[int(len(gaps) * 0.95) - 1] * 1000, 1),
+            "gap_max_ms": round(gaps[-1] * 1000, 1),
+            "stall_s": stall,
+        }
+
+    def _evaluate_step(self, step, baseline_fps):
+        reasons = []
+        if step["rejected"]:
+            reasons.append(f"{step['rejected']} conexões recusadas")
+        if step["failed"]:
+            reasons.append(f"{step['failed']} conexões encerradas com erro")
+        if (
+            baseline_fps
+            and step["fps"]["min"] < baseline_fps * self._args.min_fps_ratio
+        ):
+            reasons.append(
+                f"fps mínimo {step['fps']['min']} abaixo de "
+                f"{self._args.min_fps_ratio:.0%} do baseline {baseline_fps}"
+            )
+        if step["stall_ratio"] > self._args.max_stall_ratio:
+            reasons.append(f"{step['stall_ratio']:.1%} do tempo em stall")
+        step["degraded"] = bool(reasons)
+        step["reasons"] = reasons
+
+    def _summary(self, values):
+        if not values:
+            return {"mean": 0.0, "min": 0.0, "max": 0.0}
+        return {
+            "mean": round(sum(values) / len(values), 2),
+            "min": round(min(values), 2),
+            "max": round(max(values), 2),
+        }
+
+
+def parse_args(argv=None):
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Teste de carga do stream MJPEG")
+    parser.add_argument("--url", default=f"http://localhost:{settings.port}/video_feed")
+    parser.add_argument("--boundary", default=settings.boundary)
+    parser.add_argument("--max-connections", type=int, default=10)
+    parser.add_argument("--step", type=int, default=1, help="conexões por degrau")
+    parser.add_argument("--step-duration", type=float, default=5.0, help="s")
+    parser.add_argument("--warmup", type=float, default=1.0, help="s por degrau")
+    parser.add_argument(
+        "--keepalive-interval",
+        type=float,
+        default=settings.static_keepalive_interval,
+        help="STATIC_KEEPALIVE_INTERVAL do servidor (s)",
+    )
+    parser.add_argument(
+        "--stall-threshold",
+        type=float,
+        help="intervalo entre frames (s) contado como stall "
+        "(padrão: 4x o intervalo mediano do primeiro degrau, mínimo 0.1)",
+    )
+    parser.add_argument(
+        "--min-fps-ratio",
+        type=float,
+        default=0.8,
+        help="fração do fps do primeiro degrau abaixo da qual há degradação",
+    )
+    parser.add_argument(
+        "--max-stall-ratio",
+        type=float,
+        default=0.05,
+        help="fração do tempo em stall acima da qual há degradação",
+    )
+    parser.add_argument(
+        "--keep-going",
+        action="store_true",
+        help="continua a rampa após a primeira degradação",
+    )
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = LoadTest(args).run()
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
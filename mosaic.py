@@ -0,0 +1,284 @@
+import math
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from encoders import EncodeParams
+from streamer import EncodedFrame, FrameBuffer, SourceSupervisor, build_frame_header
+from video_source import VideoSourceFactory
+
+
+class MosaicTile:
+    def __init__(self, origin, size):
+        self._origin = origin
+        self._size = size
+        width, height = size
+        self._buffer = np.zeros((height, width, 3), np.uint8)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._resizes = 0
+
+    def update(self, img):
+        # Só redimensiona quando a fonte entrega um frame novo
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        with self._lock:
+            cv2.resize(img, self._size, dst=self._buffer, interpolation=cv2.INTER_AREA)
+            self._dirty = True
+            self._resizes += 1
+
+    def blit(self, canvas):
+        with self._lock:
+            if not self._dirty:
+                return False
+            y, x = self._origin
+            width, height = self._size
+            canvas[y : y + height, x : x + width] = self._buffer
+            self._dirty = False
+            return True
+
+    def get_resizes(self):
+        with self._lock:
+            return self._resizes
+
+
+class MosaicFeed:
+    """Fonte extra do mosaico, capturada na própria thread."""
+
+    def __init__(self, settings, spec, on_frame, active):
+        self.spec = spec
+        self._settings = settings
+        self._on_frame = on_frame
+        self._active = active
+        self._running = True
+        self._thread = None
+        self._source = VideoSourceFactory.create_from_spec(settings, spec)
+        self._supervisor = SourceSupervisor(
+            settings, self._needs_reconnect, self._reconnect, self._start
+        )
+
+    def start(self):
+        self._start()
+        self._supervisor.start()
+
+    def _start(self):
+        if self._source is None:
+            return
+        if self._source.supports_push():
+            self.set_active(self._active.is_set())
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+
+    def set_active(self, active):
+        # Fontes push só recebem listener com viewers: sem ele o pylon
+        # descarta o frame antes da conversão
+        source = self._source
+        if source is not None and source.supports_push():
+            source.set_frame_listener(self._on_frame if active else None)
+
+    def is_open(self):
+        source = self._source
+        return source is not None and source.is_available()
+
+    def _capture_loop(self):
+        while self._running and self._source.is_available():
+            # Sem viewers do mosaico a fonte não é lida nem decodificada
+            if not self._active.wait(timeout=0.5) or not self._running:
+                continue
+            try:
+                img = self._source.capture_frame()
+                if img is not None:
+                    self._on_frame(img)
+            except Exception as e:
+                print(f"Erro na captura do mosaico ({self.spec}): {e}")
+                time.sleep(0.1)
+
+    def _needs_reconnect(self):
+        if not self._running:
+            return False
+        return self._source is None or self._source.needs_reconnect()
+
+    def _reconnect(self):
+        if self._source is None:
+            # Fonte ausente na inicialização: tenta de novo (hot-plug)
+            self._source = VideoSourceFactory.create_from_spec(
+                self._settings, self.spec
+            )
+            return self._source is not None
+        return self._source.reconnect()
+
+    def close(self):
+        self._running = False
+        self._supervisor.stop()
+        if self._source is not None:
+            self._source.close()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+
+
+class MosaicStreamer:
+    """Grid com o frame mais recente de cada fonte, codificado uma vez por tick.
+
+    O primeiro tile é a fonte principal do streamer; os demais vêm de
+    MOSAIC_SOURCES. Os tiles só são atualizados enquanto há viewers, e todos
+    os viewers recebem o mesmo JPEG pelo FrameBuffer do mosaico.
+    """
+
+    def __init__(self, settings, streamer):
+        self._settings = settings
+        self._streamer = streamer
+        specs = settings.mosaic_sources
+        self._specs = specs
+        count = 1 + len(specs)
+        self._columns = settings.mosaic_columns or math.ceil(math.sqrt(count))
+        self._rows = math.ceil(count / self._columns)
+
+        width, height = settings.mosaic_tile_width, settings.mosaic_tile_height
+        self._canvas = np.zeros(
+            (self._rows * height, self._columns * width, 3), np.uint8
+        )
+        self._tiles = [
+            MosaicTile(
+                ((index // self._columns) * height, (index % self._columns) * width),
+                (width, height),
+            )
+            for index in range(count)
+        ]
+
+        # Instância própria do encoder: não compartilha estado com o stream
+        # principal, que codifica em outra thread
+        self._encode_params = EncodeParams.from_settings(
+            settings,
+            quality=settings.mosaic_jpeg_quality,
+            subsampling=settings.mosaic_jpeg_subsampling,
+        )
+        self._encoder = streamer.get_encoder_class()(self._encode_params)
+        self._frame_header = build_frame_header(settings.boundary)
+        self._buffer = FrameBuffer()
+        self._active = threading.Event()
+        self._lock = threading.Lock()
+        self._viewers = 0
+        self._encodes = 0
+        self._encode_cost = 0.0
+        self._running = True
+
+        self._feeds = []
+        for spec, tile in zip(specs, self._tiles[1:]):
+            # Fontes que não abrem agora ficam com o supervisor tentando de novo
+            feed = MosaicFeed(settings, spec, self._tile_listener(tile), self._active)
+            feed.start()
+            self._feeds.append(feed)
+
+        streamer.set_frame_tap(self._tile_listener(self._tiles[0]))
+        self._thread = threading.Thread(target=self._compose_loop, daemon=True)
+        self._thread.start()
+
+    def _tile_listener(self, tile):
+        def on_frame(img):
+            if self._active.is_set():
+                tile.update(img)
+
+        return on_frame
+
+    def _compose_loop(self):
+        interval = 1.0 / self._settings.mosaic_fps
+        last_frame = None
+        last_published = 0.0
+        next_tick = time.perf_counter()
+        while self._running:
+            if not self._active.wait(timeout=0.5):
+                continue
+
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()
+
+            # Copia para o canvas só os tiles que mudaram desde o último tick
+            changed = False
+            for tile in self._tiles:
+                changed = tile.blit(self._canvas) or changed
+
+            now = time.time()
+            if changed:
+                frame = self._encode(now)
+                if frame is not None:
+                    last_frame = frame
+                    last_published = now
+                    self._buffer.put(frame)
+            elif (
+                last_frame is not None
+                and now - last_published >= self._settings.static_keepalive_interval
+            ):
+                last_published = now
+                self._buffer.put(last_frame)
+
+    def _encode(self, captured_at):
+        started = time.perf_counter()
+        try:
+            buf = self._encoder.encode(self._canvas)
+        except Exception as e:
+            print(f"Erro ao codificar o mosaico: {e}")
+            return None
+        if buf is None:
+            return None
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._encodes += 1
+            self._encode_cost += 0.1 * (elapsed - self._encode_cost)
+        return EncodedFrame(buf, self._frame_header, captured_at)
+
+    def generate_frames(self):
+        with self._lock:
+            self._viewers += 1
+            if self._viewers == 1:
+                self._set_active(True)
+        try:
+            yield from self._streamer.generate_frames(self._buffer)
+        finally:
+            with self._lock:
+                self._viewers -= 1
+                if self._viewers == 0:
+                    self._set_active(False)
+
+    def _set_active(self, active):
+        if active:
+            self._active.set()
+        else:
+            self._active.clear()
+        for feed in self._feeds:
+            feed.set_active(active)
+
+    def get_stats(self):
+        with self._lock:
+            viewers = self._viewers
+            encodes = self._encodes
+            encode_ms = round(self._encode_cost * 1000, 2)
+        return {
+            "grid": f"{self._columns}x{self._rows}",
+            "tiles": len(self._tiles),
+            "sources": ["principal"] + self._specs,
+            "sources_open": 1 + sum(feed.is_open() for feed in self._feeds),
+            "viewers": viewers,
+            "encodes": encodes,
+            "encode_ms": encode_ms,
+            "encode_params": self._encode_params.to_dict(),
+            "tile_resizes": [tile.get_resizes() for tile in self._tiles],
+        }
+
+    def close(self):
+        self._running = False
+        self._active.set()
+        self._streamer.set_frame_tap(None)
+        for feed in self._feeds:
+            feed.close()
+        if self._thread.is_alive():
+            self._thread.join(timeout=1.0)
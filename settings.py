@@ -0,0 +1,102 @@
+import os
+
+DEFAULT_UPLOAD_FOLDER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "uploads"
+)
+
+
+def _env_bool(env, name, default):
+    return env.get(name, default).lower() == "true"
+
+
+class Settings:
+    """Configuração da aplicação lida das variáveis de ambiente.
+
+    Construída uma única vez pela application factory e repassada para o
+    streamer e as fontes de vídeo, que não leem mais o ambiente por conta
+    própria.
+    """
+
+    def __init__(self, environ=None):
+        env = os.environ if environ is None else environ
+
+        # Rede e boundary
+        self.boundary = env.get("FRAME_BOUNDARY", "frame")
+        self.host = env.get("HOST", "0.0.0.0")
+        self.port = int(env.get("PORT", 8080))
+        self.max_connections = int(env.get("MAX_CONNECTIONS", 3))
+        self.secret_key = env.get("SECRET_KEY", "video_streamer_secret_key")
+
+        # WebSocket: frames enviados e ainda não confirmados por cliente
+        self.ws_max_in_flight = int(env.get("WS_MAX_IN_FLIGHT", 2))
+
+        # Upload
+        self.upload_folder = env.get("UPLOAD_FOLDER", DEFAULT_UPLOAD_FOLDER)
+        self.allowed_extensions = {"mp4", "avi", "mov", "mkv", "webm"}
+
+        # Captura
+        self.timeout_ms = int(env.get("CAMERA_TIMEOUT_MS", 1000))
+        self.acquisition_mode = env.get("ACQUISITION_MODE", "Continuous")
+        self.grab_strategy = env.get("GRAB_STRATEGY", "LatestImageOnly")
+        self.grab_mode = env.get("GRAB_MODE", "polling").lower()  # polling | event
+        self.grab_buffer_count = int(env.get("GRAB_BUFFER_COUNT", 10))
+        self.frame_rate_enable = _env_bool(env, "ACQUISITION_FRAME_RATE_ENABLE", "True")
+        self.frame_rate = float(env.get("ACQUISITION_FRAME_RATE", "30.0"))
+
+        # Exposição e ganho
+        self.exposure_auto = env.get("EXPOSURE_AUTO", "Continuous")
+        self.exposure_time = float(env.get("EXPOSURE_TIME", "5000"))  # µs
+        self.gain_auto = env.get("GAIN_AUTO", "Continuous")
+        self.gain = float(env.get("GAIN", "0"))  # dB
+
+        # Ajustes de imagem
+        self.image_contrast = float(env.get("IMAGE_CONTRAST", "1.0"))
+        self.image_brightness = int(env.get("IMAGE_BRIGHTNESS", "0"))
+
+        # Codificação JPEG
+        self.jpeg_encoder = env.get("JPEG_ENCODER", "auto").lower()
+        self.jpeg_quality = int(env.get("JPEG_QUALITY", 95))
+        self.jpeg_subsampling = env.get("JPEG_SUBSAMPLING", "420")  # 444 | 422 | 420
+        self.jpeg_optimize = _env_bool(env, "JPEG_OPTIMIZE", "False")
+        self.jpeg_restart_interval = int(env.get("JPEG_RESTART_INTERVAL", 0))
+
+        # Reconexão automática
+        self.reconnect_initial_delay = float(env.get("RECONNECT_INITIAL_DELAY", "0.5"))
+        self.reconnect_max_delay = float(env.get("RECONNECT_MAX_DELAY", "30"))
+        self.reconnect_after_failures = int(env.get("RECONNECT_AFTER_FAILURES", 10))
+        self.supervisor_interval = 0.5  # s
+
+        # Detecção de cena estática
+        self.static_scene_threshold = float(env.get("STATIC_SCENE_THRESHOLD", "0"))
+        self.static_keepalive_interval = float(
+            env.get("STATIC_KEEPALIVE_INTERVAL", "1.0")
+        )
+
+        # Mosaico: fontes extras além da principal (camera:<serial> ou caminho
+        # de vídeo, separadas por vírgula)
+        self.mosaic_sources = [
+            spec.strip()
+            for spec in env.get("MOSAIC_SOURCES", "").split(",")
+            if spec.strip()
+        ]
+        self.mosaic_columns = int(env.get("MOSAIC_COLUMNS", 0))  # 0 = automático
+        self.mosaic_tile_width = int(env.get("MOSAIC_TILE_WIDTH", 640))
+        self.mosaic_tile_height = int(env.get("MOSAIC_TILE_HEIGHT", 360))
+        self.mosaic_fps = float(env.get("MOSAIC_FPS", "15"))
+        # Parâmetros JPEG próprios do mosaico; vazios usam os de JPEG_*
+        self.mosaic_jpeg_quality = int(
+            env.get("MOSAIC_JPEG_QUALITY") or self.jpeg_quality
+        )
+        self.mosaic_jpeg_subsampling = (
+            env.get("MOSAIC_JPEG_SUBSAMPLING") or self.jpeg_subsampling
+        )
+
+    @property
+    def uploaded_video_path(self):
+        return os.path.join(self.upload_folder, "current_video.mp4")
+
+    def allowed_file(self, filename):
+        return (
+            "." in filename
+            and filename.rsplit(".", 1)[1].lower() in self.allowed_extensions
+        )
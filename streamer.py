@@ -0,0 +1,775 @@
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from encoders import EncodeParams, EncoderSelector
+from frame_pool import FramePool
+from video_source import VideoSourceFactory
+
+FRAME_TRAILER = b"\r\n"
+
+# Cabeçalho das mensagens WebSocket: sequência, timestamp (s) e se o frame é
+# um keep-alive de cena parada (timestamp do reenvio, não da captura)
+WS_FRAME_HEADER = struct.Struct("!Qd?")
+
+
+def build_frame_header(boundary):
+    # Enquadramento multipart pré-montado, enviado em chunks separados do JPEG
+    return b"--" + boundary.encode() + b"\r\n" + b"Content-Type: image/jpeg\r\n\r\n"
+
+
+class EncodedFrame:
+    def __init__(self, jpeg, header, captured_at=None, on_copy=None):
+        # memoryview sobre a saída do encoder, sem cópia
+        self.jpeg = memoryview(jpeg).cast("B")
+        self.captured_at = captured_at
+        self.is_keepalive = False
+        self._header = header
+        self._on_copy = on_copy
+        self._payload = jpeg if isinstance(jpeg, bytes) else None
+        self._ws_message = None
+
+    def chunks(self):
+        # WSGI só aceita bytes: o JPEG é materializado uma única vez por frame
+        # e o mesmo objeto é compartilhado por todos os viewers
+        if self._payload is None:
+            self._payload = self.jpeg.tobytes()
+            self._record_copy()
+        return (self._header, self._payload, FRAME_TRAILER)
+
+    def keepalive(self, published_at):
+        # Reenvio do mesmo JPEG: compartilha os buffers, mas carrega o horário
+        # do reenvio para a latência no cliente não crescer sem limite
+        frame = EncodedFrame(self.jpeg, self._header, published_at, self._on_copy)
+        frame._payload = self._payload
+        frame.is_keepalive = True
+        return frame
+
+    def ws_message(self, sequence):
+        # Mesma mensagem para todos os clientes WebSocket com essa sequência
+        cached = self._ws_message
+        if cached is None or cached[0] != sequence:
+            header = WS_FRAME_HEADER.pack(
+                sequence, self.captured_at or 0.0, self.is_keepalive
+            )
+            cached = (sequence, header + self.jpeg)
+            self._ws_message = cached
+            self._record_copy()
+        return cached[1]
+
+    def _record_copy(self):
+        if self._on_copy is not None:
+            self._on_copy(self.jpeg.nbytes)
+
+    def __len__(self):
+        return len(self._header) + self.jpeg.nbytes + len(FRAME_TRAILER)
+
+
+class FrameBuffer:
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._frame = None
+        self._sequence = 0
+
+    def put(self, frame):
+        with self._condition:
+            self._frame = frame
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def get(self, last_sequence=0, timeout=1.0):
+        # Bloqueia até existir um frame mais novo que o último entregue ao
+        # viewer; sem fonte ativa o viewer apenas continua esperando
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._sequence != last_sequence, timeout=timeout
+            )
+            if self._sequence == last_sequence:
+                return last_sequence, None
+            return self._sequence, self._frame
+
+
+class ConnectionManager:
+    def __init__(self, max_connections):
+        self._max_connections = max_connections
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def can_connect(self):
+        with self._lock:
+            return self._count < self._max_connections
+
+    def acquire(self):
+        with self._lock:
+            if self._count < self._max_connections:
+                self._count += 1
+                return True
+            return False
+
+    def release(self):
+        with self._lock:
+            if self._count > 0:
+                self._count -= 1
+
+    def get_count(self):
+        with self._lock:
+            return self._count
+
+
+class AckWindow:
+    """Frames enviados a um cliente WebSocket e ainda não confirmados."""
+
+    def __init__(self, size):
+        self._size = max(size, 1)
+        self._pending = deque()
+
+    def is_full(self):
+        return len(self._pending) >= self._size
+
+    def sent(self, sequence):
+        self._pending.append(sequence)
+
+    def ack(self, sequence):
+        # Confirmação cumulativa: o cliente pode pular frames ao renderizar
+        # só o mais novo
+        while self._pending and self._pending[0] <= sequence:
+            self._pending.popleft()
+
+
+class WebSocketStats:
+    def __init__(self, max_in_flight):
+        self._max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._clients = 0
+        self._sent = 0
+        self._skipped = 0
+        self._acks = 0
+
+    def add_client(self):
+        with self._lock:
+            self._clients += 1
+
+    def remove_client(self):
+        with self._lock:
+            self._clients -= 1
+
+    def record_sent(self, skipped):
+        with self._lock:
+            self._sent += 1
+            self._skipped += skipped
+
+    def record_ack(self):
+        with self._lock:
+            self._acks += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "clients": self._clients,
+                "max_in_flight": self._max_in_flight,
+                "frames_sent": self._sent,
+                "frames_skipped": self._skipped,
+                "acks": self._acks,
+            }
+
+
+class ChangeDetector:
+    # Resolução reduzida usada na comparação entre frames
+    SIZE = (64, 36)
+    ROW_STEP = 4
+
+    def __init__(self, threshold):
+        self._threshold = threshold
+        width, height = self.SIZE
+        self._small = np.empty((height, width, 3), np.uint8)
+        self._gray = np.empty((height, width), np.uint8)
+        self._diff = np.empty((height, width), np.uint8)
+        self._reference = None
+        self._lock = threading.Lock()
+        self._suppressed = 0
+        self._keepalives = 0
+        self._bytes_saved = 0
+        self._encode_saved = 0.0
+        self._detect_time = 0.0
+        self._static = False
+
+    def is_enabled(self):
+        return self._threshold > 0
+
+    def has_changed(self, img):
+        if not self.is_enabled():
+            return True
+
+        started = time.perf_counter()
+        # Só uma a cada ROW_STEP linhas entra na média: a view não copia nada
+        cv2.resize(
+            img[:: self.ROW_STEP],
+            self.SIZE,
+            dst=self._small,
+            interpolation=cv2.INTER_AREA,
+        )
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+        # Cada célula é a média de uma região do frame: o ruído do sensor some
+        # e uma mudança localizada ainda aparece como diferença numa célula
+        if self._reference is None:
+            changed = True
+        else:
+            cv2.absdiff(self._gray, self._reference, dst=self._diff)
+            changed = int(self._diff.max()) > self._threshold
+
+        with self._lock:
+            self._detect_time += time.perf_counter() - started
+            self._static = not changed
+        return changed
+
+    def mark_published(self):
+        # Compara sempre com o último frame publicado, não com o anterior, para
+        # que mudanças lentas acumulem até passar do limiar
+        if not self.is_enabled():
+            return
+        if self._reference is None:
+            self._reference = self._gray.copy()
+        else:
+            self._reference[...] = self._gray
+
+    def record_suppressed(self, frame_bytes, encode_seconds, viewers):
+        with self._lock:
+            self._suppressed += 1
+            self._bytes_saved += frame_bytes * viewers
+            self._encode_saved += encode_seconds
+
+    def record_keepalive(self):
+        with self._lock:
+            self._keepalives += 1
+
+    def reset(self):
+        self._reference = None
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "enabled": self.is_enabled(),
+                "threshold": self._threshold,
+                "static": self._static,
+                "frames_suppressed": self._suppressed,
+                "keepalives_sent": self._keepalives,
+                "bandwidth_saved_mb": round(self._bytes_saved / 1_000_000, 2),
+                "cpu_saved_s": round(self._encode_saved - self._detect_time, 2),
+            }
+
+
+class SourceSupervisor:
+    def __init__(self, settings, needs_reconnect, reconnect, on_recovered):
+        self._settings = settings
+        self._needs_reconnect = needs_reconnect
+        self._reconnect = reconnect
+        self._on_recovered = on_recovered
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._reconnecting = False
+        self._disconnects = 0
+        self._attempts = 0
+        self._last_recovery = None
+        self._total_downtime = 0.0
+        self._down_since = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self._settings.supervisor_interval):
+            try:
+                if self._needs_reconnect():
+                    self._recover()
+            except Exception as e:
+                print(f"Erro no supervisor: {e}")
+
+    def _recover(self):
+        started = time.time()
+        with self._lock:
+            self._reconnecting = True
+            self._disconnects += 1
+            self._down_since = started
+
+        print("Fonte de vídeo perdida, tentando reconectar...")
+        delay = self._settings.reconnect_initial_delay
+        while True:
+            with self._lock:
+                self._attempts += 1
+            try:
+                if self._reconnect():
+                    break
+            except Exception as e:
+                print(f"Falha ao reconectar: {e}")
+
+            # Backoff exponencial entre tentativas
+            if self._stop.wait(delay):
+                return
+            delay = min(delay * 2, self._settings.reconnect_max_delay)
+
+        self._on_recovered()
+        elapsed = time.time() - started
+        with self._lock:
+            self._reconnecting = False
+            self._last_recovery = elapsed
+            self._total_downtime += elapsed
+            self._down_since = None
+        print(f"Fonte de vídeo reconectada em {elapsed:.1f}s")
+
+    def get_stats(self):
+        with self._lock:
+            downtime = self._total_downtime
+            if self._down_since is not None:
+                downtime += time.time() - self._down_since
+            return {
+                "state": "reconnecting" if self._reconnecting else "ok",
+                "disconnects": self._disconnects,
+                "reconnect_attempts": self._attempts,
+                "last_recovery_s": (
+                    round(self._last_recovery, 2)
+                    if self._last_recovery is not None
+                    else None
+                ),
+                "total_downtime_s": round(downtime, 1),
+            }
+
+
+class VideoController:
+    def __init__(self, settings, encoder_class, viewer_count=None, frame_tap=None):
+        self._settings = settings
+        self._encode_params = EncodeParams.from_settings(settings)
+        self._encoder = encoder_class(self._encode_params)
+        self._frame_header = build_frame_header(settings.boundary)
+        self._source_open_time = None
+        self._source = self._open_source()
+        self._pool = self._source.get_frame_pool() if self._source else FramePool()
+        self._viewer_count = viewer_count or (lambda: 0)
+        self._frame_tap = frame_tap
+        self._detector = ChangeDetector(settings.static_scene_threshold)
+        self._last_frame = None
+        self._last_published = 0.0
+        self._encode_cost = 0.0
+        self._running = True
+
+    def _open_source(self):
+        started = time.perf_counter()
+        source = VideoSourceFactory.create_source(self._settings)
+        if source:
+            self._source_open_time = time.perf_counter() - started
+        return source
+
+    def start_capture(self):
+        if self._source:
+            self._source.start_capture()
+
+    def is_available(self):
+        return self._source and self._source.is_available()
+
+    def supports_push(self):
+        return bool(self._source) and self._source.supports_push()
+
+    def needs_reconnect(self):
+        if not self._source:
+            return True
+        return self._source.needs_reconnect()
+
+    def reconnect(self):
+        if not self._source:
+            # Nenhuma fonte na inicialização: tenta de novo (hot-plug)
+            self._source = self._open_source()
+            if not self._source:
+                return False
+            self._pool = self._source.get_frame_pool()
+            return self._source.is_available()
+        self._detector.reset()
+        return self._source.reconnect()
+
+    def set_frame_listener(self, listener):
+        def on_frame(img):
+            frame = self._process_frame(img)
+            if frame is not None:
+                listener(frame)
+
+        self._source.set_frame_listener(on_frame)
+
+    def capture_frame(self):
+        if not self.is_available():
+            return None
+
+        img = self._source.capture_frame()
+        if img is None:
+            return None
+
+        return self._process_frame(img)
+
+    def set_frame_tap(self, frame_tap):
+        self._frame_tap = frame_tap
+
+    def _process_frame(self, img):
+        self._pool.record_frame()
+        now = time.time()
+
+        # Frame bruto para outros consumidores (mosaico), antes da supressão
+        # de cena estática; o buffer é do pool, então o uso é síncrono
+        if self._frame_tap is not None:
+            self._frame_tap(img)
+
+        # Cena parada: não codifica nem distribui, só reenvia o último JPEG
+        # periodicamente como keep-alive
+        if not self._detector.has_changed(img) and self._last_frame is not None:
+            if now - self._last_published < self._settings.static_keepalive_interval:
+                self._detector.record_suppressed(
+                    len(self._last_frame), self._encode_cost, self._viewer_count()
+                )
+                return None
+            self._last_published = now
+            self._detector.record_keepalive()
+            return self._last_frame.keepalive(now)
+
+        frame = self._encode_frame(img, now)
+        if frame is not None:
+            self._detector.mark_published()
+            self._last_frame = frame
+            self._last_published = now
+        return frame
+
+    def _encode_frame(self, img, captured_at):
+        started = time.perf_counter()
+
+        # Apply image adjustments if needed
+        settings = self._settings
+        if settings.image_contrast != 1.0 or settings.image_brightness != 0:
+            img = self._apply_image_adjustments(img)
+
+        buf = self._encoder.encode(img)
+        if buf is None:
+            return None
+
+        # Média móvel do custo de codificação, usada para estimar a CPU
+        # economizada com frames suprimidos
+        elapsed = time.perf_counter() - started
+        self._encode_cost += 0.1 * (elapsed - self._encode_cost)
+        return EncodedFrame(buf, self._frame_header, captured_at, self._record_copy)
+
+    def _record_copy(self, nbytes):
+        # Cópias do JPEG na saída (bytes para o WSGI, mensagem WebSocket)
+        # entram na mesma métrica das cópias do caminho de captura
+        self._pool.record_copy(nbytes)
+
+    def _apply_image_adjustments(self, img):
+        # Apply contrast and brightness: new_img = contrast * img + brightness
+        adjusted = self._pool.acquire(img.shape, img.dtype)
+        cv2.convertScaleAbs(
+            img,
+            dst=adjusted,
+            alpha=self._settings.image_contrast,
+            beta=self._settings.image_brightness,
+        )
+        return adjusted
+
+    def close(self):
+        self._running = False
+        if self._source:
+            self._source.close()
+
+    def get_source_type(self):
+        if not self._source:
+            return "None"
+        return type(self._source).__name__
+
+    def get_buffer_stats(self):
+        return self._pool.get_stats()
+
+    def get_grab_stats(self):
+        if not self._source:
+            return {}
+        return self._source.get_grab_stats()
+
+    def get_static_scene_stats(self):
+        return self._detector.get_stats()
+
+    def get_source_open_time(self):
+        return self._source_open_time
+
+    def get_encoder_stats(self):
+        return {
+            "backend": self._encoder.name,
+            "params": self._encode_params.to_dict(),
+            "encode_ms": round(self._encode_cost * 1000, 2),
+        }
+
+
+class StatusTracker:
+    def __init__(self):
+        self._start_time = datetime.now()
+        self._frame_count = 0
+        self._last_frame_time = time.time()
+        self._fps_samples = []
+        self._lock = threading.Lock()
+
+    def record_frame(self):
+        current_time = time.time()
+        with self._lock:
+            self._frame_count += 1
+            frame_time = current_time - self._last_frame_time
+            self._fps_samples.append(frame_time)
+            self._last_frame_time = current_time
+
+            # Keep only last 30 samples
+            if len(self._fps_samples) > 30:
+                self._fps_samples.pop(0)
+
+    def get_fps(self):
+        with self._lock:
+            if len(self._fps_samples) < 2:
+                return 0.0
+            return len(self._fps_samples) / sum(self._fps_samples)
+
+    def get_frame_count(self):
+        with self._lock:
+            return self._frame_count
+
+    def get_uptime(self):
+        return datetime.now() - self._start_time
+
+
+class VideoStreamer:
+    def __init__(self, settings):
+        self._settings = settings
+        self._connections = ConnectionManager(settings.max_connections)
+        self._encoder_selector = EncoderSelector(
+            settings.jpeg_encoder, EncodeParams.from_settings(settings)
+        )
+        self._encoder_class = self._encoder_selector.select()
+        self._frame_tap = None
+        self._video_controller = VideoController(
+            settings, self._encoder_class, self._connections.get_count
+        )
+        self._buffer = FrameBuffer()
+        self._status = StatusTracker()
+        self._ws_stats = WebSocketStats(settings.ws_max_in_flight)
+        self._capture_thread = None
+        self._running = True
+        self._source_lock = threading.Lock()
+        self._reconnecting = None
+        self._start_capture_thread()
+        self._supervisor = SourceSupervisor(
+            settings,
+            self._source_needs_reconnect,
+            self._reconnect_source,
+            self._resume_capture,
+        )
+        self._supervisor.start()
+
+    def _start_capture_thread(self):
+        self._video_controller.start_capture()
+
+        # Fontes com grab orientado a eventos publicam direto da thread do
+        # pylon; as demais são lidas pelo loop de captura
+        if self._video_controller.supports_push():
+            self._capture_thread = None
+            self._video_controller.set_frame_listener(self._publish_frame)
+            return
+
+        self._capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._capture_thread.start()
+
+    def _capture_loop(self):
+        while self._video_controller.is_available():
+            try:
+                frame = self._video_controller.capture_frame()
+                if frame is not None:
+                    self._publish_frame(frame)
+            except Exception as e:
+                print(f"Erro na captura: {e}")
+                time.sleep(0.1)
+
+    def _publish_frame(self, frame):
+        self._buffer.put(frame)
+        self._status.record_frame()
+
+    def _source_needs_reconnect(self):
+        with self._source_lock:
+            return self._running and self._video_controller.needs_reconnect()
+
+    def _reconnect_source(self):
+        with self._source_lock:
+            if not self._running:
+                return True
+            controller = self._video_controller
+            if not controller.needs_reconnect():
+                # Um upload já trocou por uma fonte funcionando
+                return True
+            self._reconnecting = controller
+
+        # A reabertura (device do pylon, configuração) roda fora do lock para
+        # não travar /upload nem set_frame_tap durante o backoff
+        try:
+            recovered = controller.reconnect()
+        finally:
+            with self._source_lock:
+                self._reconnecting = None
+                replaced = controller is not self._video_controller or not self._running
+
+        if replaced:
+            # Um upload trocou a fonte (ou o streamer foi encerrado) durante a
+            # reconexão: descarta a antiga
+            try:
+                controller.close()
+            except Exception as e:
+                print(f"Erro ao fechar a fonte antiga: {e}")
+            return True
+        return recovered
+
+    def _resume_capture(self):
+        with self._source_lock:
+            if not self._running:
+                return
+            # A thread antiga encerra ao ver a fonte indisponível; se continuar
+            # viva após o join ela já está capturando da fonte reconectada
+            if self._capture_thread and self._capture_thread.is_alive():
+                self._capture_thread.join(timeout=0.2)
+                if self._capture_thread.is_alive():
+                    return
+            self._start_capture_thread()
+
+    def is_source_available(self):
+        return bool(self._video_controller.is_available())
+
+    def get_source_open_time(self):
+        return self._video_controller.get_source_open_time()
+
+    def get_supervisor_stats(self):
+        return self._supervisor.get_stats()
+
+    def can_connect(self):
+        return self._connections.can_connect()
+
+    def get_encoder_class(self):
+        return self._encoder_class
+
+    def set_frame_tap(self, frame_tap):
+        with self._source_lock:
+            self._frame_tap = frame_tap
+            self._video_controller.set_frame_tap(frame_tap)
+
+    def generate_frames(self, buffer=None):
+        # Outros streams (mosaico) usam o mesmo fan-out e o mesmo limite de
+        # conexões, cada um com seu FrameBuffer
+        buffer = self._buffer if buffer is None else buffer
+        if not self._connections.acquire():
+            return
+
+        try:
+            # Viewers continuam conectados enquanto a fonte reconecta
+            sequence = 0
+            while self._running:
+                sequence, frame = buffer.get(sequence)
+                if frame is not None:
+                    yield from frame.chunks()
+        except GeneratorExit:
+            pass
+        finally:
+            self._connections.release()
+
+    def serve_websocket(self, ws):
+        # ws segue a interface do simple-websocket: send(bytes) e
+        # receive(timeout) retornando None quando nada chegou
+        if not self._connections.acquire():
+            return
+
+        self._ws_stats.add_client()
+        window = AckWindow(self._settings.ws_max_in_flight)
+        try:
+            sequence = 0
+            while self._running:
+                # Janela cheia: só espera confirmações. Enquanto isso o
+                # FrameBuffer guarda apenas o frame mais novo
+                message = ws.receive(timeout=1.0 if window.is_full() else 0)
+                if message is not None:
+                    try:
+                        window.ack(int(message))
+                    except ValueError:
+                        continue
+                    self._ws_stats.record_ack()
+                    continue
+
+                if window.is_full():
+                    continue
+
+                previous = sequence
+                sequence, frame = self._buffer.get(sequence)
+                if frame is None:
+                    continue
+
+                ws.send(frame.ws_message(sequence))
+                window.sent(sequence)
+                self._ws_stats.record_sent(sequence - previous - 1 if previous else 0)
+        finally:
+            self._ws_stats.remove_client()
+            self._connections.release()
+
+    def get_status(self):
+        return {
+            "source_type": self._video_controller.get_source_type(),
+            "source_available": self._video_controller.is_available(),
+            "active_connections": self._connections.get_count(),
+            "max_connections": self._settings.max_connections,
+            "fps": round(self._status.get_fps(), 2),
+            "total_frames": self._status.get_frame_count(),
+            "uptime": str(self._status.get_uptime()).split(".")[0],
+            "configured_fps": self._settings.frame_rate,
+            "buffers": self._video_controller.get_buffer_stats(),
+            "grab_mode": self._settings.grab_mode,
+            "grab": self._video_controller.get_grab_stats(),
+            "supervisor": self.get_supervisor_stats(),
+            "static_scene": self._video_controller.get_static_scene_stats(),
+            "source_open_s": self._video_controller.get_source_open_time(),
+            "websocket": self._ws_stats.get_stats(),
+            "encoder": dict(
+                self._video_controller.get_encoder_stats(),
+                benchmark_ms=self._encoder_selector.benchmark_ms,
+            ),
+        }
+
+    def restart_with_new_source(self):
+        with self._source_lock:
+            # Para a captura atual; se o supervisor está reconectando essa
+            # fonte, ele mesmo a fecha ao terminar
+            if self._video_controller is not self._reconnecting:
+                self._video_controller.close()
+
+            # Cria novo controller
+            self._video_controller = VideoController(
+                self._settings,
+                self._encoder_class,
+                self._connections.get_count,
+                self._frame_tap,
+            )
+
+            # Reinicia thread de captura
+            if self._capture_thread and self._capture_thread.is_alive():
+                self._capture_thread.join(timeout=1.0)
+
+            self._start_capture_thread()
+
+    def close(self):
+        with self._source_lock:
+            self._running = False
+            reconnecting = self._video_controller is self._reconnecting
+        self._supervisor.stop()
+        if not reconnecting:
+            self._video_controller.close()
+        if self._capture_thread and self._capture_thread.is_alive():
+            self._capture_thread.join(timeout=1.0)
@@ -10,12 +10,13 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
+    from settings import Settings
     from video_source import VideoSourceFactory
 
     print("✓ video_source importado com sucesso")
 
     # Testa a factory
-    source = VideoSourceFactory.create_source()
+    source = VideoSourceFactory.create_source(Settings())
     if source is None:
         print("⚠ Nenhuma fonte de vídeo disponível (normal sem câmera ou vídeo)")
     else:
@@ -0,0 +1,76 @@
+import numpy as np
+
+from streamer import ChangeDetector
+
+HEIGHT, WIDTH = 720, 1280
+
+
+def noisy_background(rng, sigma=3.0):
+    # Fundo fixo com ruído de sensor gaussiano diferente a cada frame
+    noise = rng.normal(0, sigma, (HEIGHT, WIDTH, 1))
+    frame = np.clip(110 + noise, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(np.repeat(frame, 3, axis=2))
+
+
+def frame_with_square(rng, x, size=24):
+    frame = noisy_background(rng)
+    frame[340 : 340 + size, x : x + size] = 240
+    return frame
+
+
+def publish(detector, frame):
+    changed = detector.has_changed(frame)
+    if changed:
+        detector.mark_published()
+    return changed
+
+
+def test_sensor_noise_is_static():
+    rng = np.random.default_rng(1)
+    detector = ChangeDetector(threshold=6)
+    assert publish(detector, noisy_background(rng))
+
+    results = [publish(detector, noisy_background(rng)) for _ in range(30)]
+
+    assert not any(results)
+    assert detector.get_stats()["static"]
+
+
+def test_small_moving_square_is_never_suppressed():
+    rng = np.random.default_rng(2)
+    detector = ChangeDetector(threshold=6)
+
+    # Quadrado de 24 px andando 4 px por frame: ~0.04% dos pixels mudam
+    results = [
+        publish(detector, frame_with_square(rng, 100 + 4 * i)) for i in range(60)
+    ]
+
+    assert all(results)
+
+
+def test_slow_drift_is_published_against_last_published_frame():
+    rng = np.random.default_rng(3)
+    detector = ChangeDetector(threshold=6)
+    publish(detector, noisy_background(rng))
+
+    # Cada passo fica abaixo do limiar, mas a soma em relação ao último
+    # frame publicado ultrapassa
+    results = []
+    for level in range(1, 12):
+        frame = noisy_background(rng)
+        frame[:, : WIDTH // 2] = np.clip(
+            frame[:, : WIDTH // 2].astype(int) + level, 0, 255
+        )
+        results.append(publish(detector, frame))
+
+    assert not results[0]
+    assert any(results)
+
+
+def test_threshold_zero_disables_detection():
+    rng = np.random.default_rng(4)
+    detector = ChangeDetector(threshold=0)
+    frame = noisy_background(rng)
+
+    assert not detector.is_enabled()
+    assert all(publish(detector, frame) for _ in range(5))
@@ -0,0 +1,38 @@
+import numpy as np
+
+from streamer import WS_FRAME_HEADER, EncodedFrame, build_frame_header
+
+
+def make_frame(captured_at=100.0, copies=None):
+    jpeg = np.frombuffer(b"\xff\xd8jpeg\xff\xd9", np.uint8)
+    on_copy = copies.append if copies is not None else None
+    return EncodedFrame(jpeg, build_frame_header("frame"), captured_at, on_copy)
+
+
+def test_ws_message_carries_sequence_timestamp_and_jpeg():
+    message = make_frame().ws_message(7)
+
+    sequence, timestamp, keepalive = WS_FRAME_HEADER.unpack_from(message)
+    assert (sequence, timestamp, keepalive) == (7, 100.0, False)
+    assert message[WS_FRAME_HEADER.size :] == b"\xff\xd8jpeg\xff\xd9"
+
+
+def test_keepalive_uses_publish_time_and_is_marked():
+    keepalive = make_frame(captured_at=100.0).keepalive(160.0)
+
+    _, timestamp, is_keepalive = WS_FRAME_HEADER.unpack_from(keepalive.ws_message(8))
+    assert timestamp == 160.0
+    assert is_keepalive
+    assert keepalive.chunks()[1] == b"\xff\xd8jpeg\xff\xd9"
+
+
+def test_output_copies_are_recorded_once_per_frame():
+    copies = []
+    frame = make_frame(copies=copies)
+
+    frame.chunks()
+    frame.chunks()
+    frame.ws_message(1)
+    frame.ws_message(1)
+
+    assert copies == [8, 8]
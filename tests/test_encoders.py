@@ -0,0 +1,64 @@
+import encoders
+from encoders import (
+    EncodeParams,
+    EncoderSelector,
+    JpegEncoder,
+    OpenCVEncoder,
+    SimpleJpegEncoder,
+)
+from settings import Settings
+
+
+class MissingLibraryEncoder(JpegEncoder):
+    name = "missing"
+
+    def __init__(self, params):
+        raise RuntimeError("missing not available")
+
+    def encode(self, img):
+        return None
+
+
+def test_explicit_backend_is_kept_when_it_supports_params():
+    selector = EncoderSelector("opencv", EncodeParams(optimize=True))
+
+    assert selector.select() is OpenCVEncoder
+
+
+def test_explicit_backend_without_support_falls_back_to_opencv(capsys):
+    params = EncodeParams(optimize=True, restart_interval=4)
+    selector = EncoderSelector(SimpleJpegEncoder.name, params)
+
+    assert selector.select() is OpenCVEncoder
+    assert "usando opencv" in capsys.readouterr().out
+
+
+def test_explicit_backend_without_library_falls_back_to_opencv(capsys, monkeypatch):
+    monkeypatch.setitem(encoders.ENCODERS, "missing", MissingLibraryEncoder)
+    selector = EncoderSelector("missing", EncodeParams())
+
+    assert selector.select() is OpenCVEncoder
+    out = capsys.readouterr().out
+    assert "missing indisponível" in out
+    assert "usando opencv" in out
+
+
+def test_auto_only_benchmarks_backends_that_support_params():
+    selector = EncoderSelector("auto", EncodeParams(restart_interval=4))
+
+    assert selector.select() is OpenCVEncoder
+    assert list(selector.benchmark_ms) == ["opencv"]
+
+
+def test_mosaic_params_override_quality_and_fall_back_to_jpeg_settings():
+    settings = Settings({"JPEG_QUALITY": "95", "MOSAIC_JPEG_QUALITY": "70"})
+
+    params = EncodeParams.from_settings(
+        settings,
+        quality=settings.mosaic_jpeg_quality,
+        subsampling=settings.mosaic_jpeg_subsampling,
+    )
+
+    assert params.quality == 70
+    assert params.subsampling == settings.jpeg_subsampling
+    assert EncodeParams.from_settings(settings).quality == 95
@@ -0,0 +1,90 @@
+import random
+
+from load_test import LoadTest, MultipartFrameCounter, parse_args
+from streamer import FRAME_TRAILER, build_frame_header
+
+
+def multipart_stream(sizes, boundary="frame"):
+    header = build_frame_header(boundary)
+    # Conteúdo parecido com o marcador ("-frame") sem chegar a ser um boundary
+    parts = [header + (b"frame-" * size)[:size] + FRAME_TRAILER for size in sizes]
+    return b"".join(parts) + header
+
+
+def count_frames(stream, chunk_sizes, boundary="frame"):
+    counter = MultipartFrameCounter(boundary)
+    completed = []
+    position = 0
+    for size in chunk_sizes:
+        completed.extend(counter.feed(stream[position : position + size]))
+        position += size
+    completed.extend(counter.feed(stream[position:]))
+    return completed
+
+
+def test_counts_frames_in_a_single_read():
+    sizes = [1000, 20, 5000]
+    header_and_trailer = len(build_frame_header("frame")) - len(b"--frame")
+    header_and_trailer += len(FRAME_TRAILER)
+
+    completed = count_frames(multipart_stream(sizes), [])
+
+    assert completed == [size + header_and_trailer for size in sizes]
+
+
+def test_boundaries_split_across_reads():
+    rng = random.Random(0)
+    sizes = [rng.randint(1, 3000) for _ in range(50)]
+    stream = multipart_stream(sizes)
+    expected = count_frames(stream, [])
+
+    for _ in range(200):
+        chunks = [rng.randint(1, 12) for _ in range(len(stream) // 6)]
+        assert count_frames(stream, chunks) == expected
+
+
+def test_one_byte_reads():
+    stream = multipart_stream([10, 200, 3])
+
+    assert len(count_frames(stream, [1] * len(stream))) == 3
+
+
+class RecordedClient:
+    def __init__(self, times):
+        self._frames = [(timestamp, 1000) for timestamp in times]
+
+    def frames_between(self, start, end):
+        return [frame for frame in self._frames if start <= frame[0] < end]
+
+
+def test_default_stall_threshold_follows_baseline_frame_interval():
+    load_test = LoadTest(parse_args([]))
+    # ~30 fps: um congelamento de 0.5 s tem que contar como stall
+    load_test._clients = [RecordedClient([i / 30 for i in range(150)])]
+
+    threshold = load_test._baseline_stall_threshold(0.0, 5.0)
+
+    assert 0.1 <= threshold < 0.5
+
+
+def test_explicit_stall_threshold_is_kept():
+    load_test = LoadTest(parse_args(["--stall-threshold", "2.0"]))
+
+    assert load_test._stall_threshold == 2.0
+
+
+def test_stall_threshold_without_baseline_frames_uses_fallback():
+    load_test = LoadTest(parse_args([]))
+    load_test._clients = [RecordedClient([])]
+
+    threshold = load_test._baseline_stall_threshold(0.0, 5.0)
+
+    assert threshold == LoadTest.FALLBACK_STALL_THRESHOLD
+
+
+def test_keepalive_only_baseline_is_flagged():
+    load_test = LoadTest(parse_args(["--keepalive-interval", "1.0"]))
+
+    assert load_test._looks_like_keepalives(1.0)
+    assert not load_test._looks_like_keepalives(15.0)
+    assert not load_test._looks_like_keepalives(0.0)
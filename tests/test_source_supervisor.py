@@ -0,0 +1,124 @@
+import threading
+import time
+
+from settings import Settings
+from streamer import SourceSupervisor, VideoStreamer
+
+
+class RecordingEvent(threading.Event):
+    """Event que registra os timeouts de cada wait (os atrasos do backoff)."""
+
+    def __init__(self):
+        super().__init__()
+        self.waits = []
+
+    def wait(self, timeout=None):
+        self.waits.append(timeout)
+        return super().wait(timeout)
+
+
+def make_settings():
+    settings = Settings(
+        {"RECONNECT_INITIAL_DELAY": "0.01", "RECONNECT_MAX_DELAY": "0.04"}
+    )
+    settings.supervisor_interval = 0.01
+    return settings
+
+
+def make_supervisor(reconnect, recovered):
+    supervisor = SourceSupervisor(
+        make_settings(), lambda: True, reconnect, lambda: recovered.append(True)
+    )
+    supervisor._stop = RecordingEvent()
+    return supervisor
+
+
+def test_backoff_doubles_up_to_max_delay_and_stats_are_reported():
+    results = iter([False] * 5 + [True])
+    recovered = []
+    supervisor = make_supervisor(lambda: next(results), recovered)
+
+    supervisor._recover()
+
+    assert supervisor._stop.waits == [0.01, 0.02, 0.04, 0.04, 0.04]
+    assert recovered == [True]
+    stats = supervisor.get_stats()
+    assert stats["state"] == "ok"
+    assert stats["disconnects"] == 1
+    assert stats["reconnect_attempts"] == 6
+    assert stats["last_recovery_s"] is not None
+
+
+def test_stop_during_backoff_ends_recovery_without_on_recovered():
+    attempts = []
+    recovered = []
+
+    def reconnect():
+        attempts.append(time.time())
+        return False
+
+    supervisor = make_supervisor(reconnect, recovered)
+    supervisor.start()
+    deadline = time.time() + 2.0
+    while len(attempts) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    supervisor.stop()
+    supervisor._thread.join(timeout=1.0)
+
+    assert len(attempts) >= 2
+    assert not supervisor._thread.is_alive()
+    assert recovered == []
+
+
+class StubController:
+    def __init__(self, on_reconnect=None):
+        self._on_reconnect = on_reconnect
+        self.closed = False
+
+    def needs_reconnect(self):
+        return True
+
+    def reconnect(self):
+        if self._on_reconnect:
+            self._on_reconnect()
+        return False
+
+    def close(self):
+        self.closed = True
+
+
+def make_streamer(controller):
+    # Só o estado usado por _reconnect_source, sem abrir fonte de vídeo
+    streamer = VideoStreamer.__new__(VideoStreamer)
+    streamer._running = True
+    streamer._source_lock = threading.Lock()
+    streamer._reconnecting = None
+    streamer._video_controller = controller
+    return streamer
+
+
+def test_upload_during_reconnect_closes_the_old_controller():
+    uploaded = StubController()
+    old = StubController()
+    streamer = make_streamer(old)
+
+    def upload():
+        # Chega enquanto o reconnect roda fora do lock
+        assert streamer._source_lock.acquire(timeout=1.0)
+        streamer._video_controller = uploaded
+        streamer._source_lock.release()
+
+    old._on_reconnect = upload
+
+    assert streamer._reconnect_source() is True
+    assert old.closed
+    assert not uploaded.closed
+    assert streamer._reconnecting is None
+
+
+def test_failed_reconnect_keeps_the_controller():
+    controller = StubController()
+    streamer = make_streamer(controller)
+
+    assert streamer._reconnect_source() is False
+    assert not controller.closed
@@ -0,0 +1,94 @@
+import numpy as np
+
+from settings import Settings
+from streamer import (
+    WS_FRAME_HEADER,
+    ConnectionManager,
+    EncodedFrame,
+    FrameBuffer,
+    VideoStreamer,
+    WebSocketStats,
+    build_frame_header,
+)
+
+
+class ScriptedWebSocket:
+    """Cada receive executa o próximo passo do roteiro; sem passos, desconecta."""
+
+    def __init__(self, steps):
+        self._steps = list(steps)
+        self.sent = []
+        self.timeouts = []
+
+    def send(self, message):
+        self.sent.append(WS_FRAME_HEADER.unpack_from(message)[0])
+
+    def receive(self, timeout=None):
+        self.timeouts.append(timeout)
+        if not self._steps:
+            raise ConnectionError("cliente desconectou")
+        return self._steps.pop(0)()
+
+
+def make_streamer(max_in_flight=2):
+    # Só o estado usado por serve_websocket, sem abrir fonte de vídeo
+    settings = Settings({"WS_MAX_IN_FLIGHT": str(max_in_flight)})
+    streamer = VideoStreamer.__new__(VideoStreamer)
+    streamer._settings = settings
+    streamer._running = True
+    streamer._buffer = FrameBuffer()
+    streamer._connections = ConnectionManager(settings.max_connections)
+    streamer._ws_stats = WebSocketStats(settings.ws_max_in_flight)
+    return streamer
+
+
+def publish(streamer, count=1):
+    jpeg = np.frombuffer(b"\xff\xd8jpeg\xff\xd9", np.uint8)
+
+    def step():
+        for _ in range(count):
+            streamer._buffer.put(EncodedFrame(jpeg, build_frame_header("frame")))
+        return None
+
+    return step
+
+
+def serve(streamer, steps):
+    ws = ScriptedWebSocket(steps)
+    try:
+        streamer.serve_websocket(ws)
+    except ConnectionError:
+        pass
+    return ws
+
+
+def test_unacked_frames_are_limited_to_the_window():
+    streamer = make_streamer(max_in_flight=2)
+
+    ws = serve(streamer, [publish(streamer)] * 5)
+
+    assert ws.sent == [1, 2]
+    # Janela cheia: espera confirmações em vez de ler o buffer
+    assert ws.timeouts[-2:] == [1.0, 1.0]
+
+
+def test_cumulative_ack_frees_the_window_and_sends_the_newest_frame():
+    streamer = make_streamer(max_in_flight=2)
+
+    ws = serve(
+        streamer,
+        [publish(streamer), publish(streamer), publish(streamer, 3), lambda: "2"]
+        + [lambda: None],
+    )
+
+    assert ws.sent == [1, 2, 5]
+    assert streamer._ws_stats.get_stats()["frames_skipped"] == 2
+
+
+def test_slot_and_client_count_are_released_on_disconnect():
+    streamer = make_streamer()
+
+    serve(streamer, [publish(streamer)])
+
+    assert streamer._connections.get_count() == 0
+    assert streamer._ws_stats.get_stats()["clients"] == 0
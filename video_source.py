@@ -4,10 +4,35 @@ import time
 import threading
 from abc import ABC, abstractmethod
 
+import numpy as np
+
+from frame_pool import FramePool
+
 
 class VideoSource(ABC):
     def __init__(self):
         self._running = True
+        self._pool = FramePool()
+
+    def get_frame_pool(self):
+        return self._pool
+
+    def supports_push(self):
+        return False
+
+    def set_frame_listener(self, listener):
+        # Só fontes com supports_push() entregam frames ao listener
+        pass
+
+    def get_grab_stats(self):
+        return {}
+
+    def needs_reconnect(self):
+        return not self.is_available()
+
+    @abstractmethod
+    def reconnect(self):
+        pass
 
     @abstractmethod
     def start_capture(self):
@@ -26,50 +51,131 @@ class VideoSource(ABC):
         pass
 
 
-class BaslerCameraSource(VideoSource):
+class GrabStatistics:
+    # BlockID indisponível (ex.: câmera emulada)
+    NO_BLOCK_ID = 0xFFFFFFFFFFFFFFFF
+
     def __init__(self):
+        self._lock = threading.Lock()
+        self._grabbed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._skipped = 0
+        self._lost = 0
+        self._underruns = 0
+        self._last_block_id = None
+        self._consecutive_failures = 0
+
+    def record_result(self, result):
+        with self._lock:
+            if not result.GrabSucceeded():
+                self._failed += 1
+                self._consecutive_failures += 1
+                return
+
+            self._grabbed += 1
+            self._consecutive_failures = 0
+            # Frames descartados pela GrabStrategy (consumidor mais lento)
+            self._skipped += result.GetNumberOfSkippedImages()
+
+            # Saltos no BlockID são frames que a câmera enviou mas que não
+            # encontraram buffer livre no host
+            block_id = result.GetBlockID()
+            if block_id == self.NO_BLOCK_ID:
+                return
+            if self._last_block_id is not None:
+                gap = (
+                    block_id
+                    - self._last_block_id
+                    - 1
+                    - result.GetNumberOfSkippedImages()
+                )
+                if gap > 0:
+                    self._lost += gap
+                    self._underruns += 1
+            self._last_block_id = block_id
+
+    def record_timeout(self):
+        with self._lock:
+            self._timeouts += 1
+
+    def record_failure(self):
+        with self._lock:
+            self._failed += 1
+            self._consecutive_failures += 1
+
+    def get_consecutive_failures(self):
+        with self._lock:
+            return self._consecutive_failures
+
+    def reset_sequence(self):
+        with self._lock:
+            self._last_block_id = None
+            self._consecutive_failures = 0
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "frames_grabbed": self._grabbed,
+                "grab_failures": self._failed,
+                "grab_timeouts": self._timeouts,
+                "frames_skipped": self._skipped,
+                "frames_lost": self._lost,
+                "buffer_underruns": self._underruns,
+            }
+
+
+class BaslerCameraSource(VideoSource):
+    def __init__(self, settings, serial_number=None):
         super().__init__()
+        self._settings = settings
         try:
             from pypylon import pylon
 
             self._pylon = pylon
+            self._serial_number = serial_number
             self._camera = self._create_camera()
             self._converter = self._create_converter()
+            self._cv_conversions = self._create_cv_conversions()
+            self._depth_buffer = None
+            self._grab_stats = GrabStatistics()
+            self._frame_listener = None
+            self._event_handler = None
         except ImportError:
             raise RuntimeError("pypylon not available")
 
     def _create_camera(self):
         tl_factory = self._pylon.TlFactory.GetInstance()
-        device = tl_factory.CreateFirstDevice()
+        if self._serial_number:
+            # Reconexão: procura exatamente a mesma câmera pelo número de série
+            device_info = self._pylon.DeviceInfo()
+            device_info.SetSerialNumber(self._serial_number)
+            device = tl_factory.CreateFirstDevice(device_info)
+        else:
+            device = tl_factory.CreateFirstDevice()
         camera = self._pylon.InstantCamera(device)
         camera.Open()
+        self._serial_number = camera.GetDeviceInfo().GetSerialNumber()
         self._configure_camera(camera)
         return camera
 
     def _configure_camera(self, camera):
-        from capture import (
-            ACQUISITION_MODE,
-            ACQUISITION_FRAME_RATE_ENABLE,
-            FRAME_RATE,
-            EXPOSURE_AUTO,
-            EXPOSURE_TIME,
-            GAIN_AUTO,
-            GAIN,
-        )
+        # Os settings são a configuração em cache reaplicada a cada reconexão
+        config = self._settings
 
-        camera.AcquisitionMode.SetValue(ACQUISITION_MODE)
-        camera.AcquisitionFrameRateEnable.SetValue(ACQUISITION_FRAME_RATE_ENABLE)
+        camera.AcquisitionMode.SetValue(config.acquisition_mode)
+        camera.AcquisitionFrameRateEnable.SetValue(config.frame_rate_enable)
 
-        if ACQUISITION_FRAME_RATE_ENABLE:
-            camera.AcquisitionFrameRate.SetValue(FRAME_RATE)
+        if config.frame_rate_enable:
+            camera.AcquisitionFrameRate.SetValue(config.frame_rate)
 
-        camera.ExposureAuto.SetValue(EXPOSURE_AUTO)
-        if EXPOSURE_AUTO == "Off":
-            camera.ExposureTime.SetValue(EXPOSURE_TIME)
+        camera.ExposureAuto.SetValue(config.exposure_auto)
+        if config.exposure_auto == "Off":
+            camera.ExposureTime.SetValue(config.exposure_time)
 
-        camera.GainAuto.SetValue(GAIN_AUTO)
-        if GAIN_AUTO == "Off":
-            camera.Gain.SetValue(GAIN)
+        camera.GainAuto.SetValue(config.gain_auto)
+        if config.gain_auto == "Off":
+            camera.Gain.SetValue(config.gain)
 
     def _create_converter(self):
         converter = self._pylon.ImageFormatConverter()
@@ -77,39 +183,190 @@ class BaslerCameraSource(VideoSource):
         converter.OutputBitAlignment = self._pylon.OutputBitAlignment_MsbAligned
         return converter
 
+    def _create_cv_conversions(self):
+        # Formatos que o OpenCV converte direto do buffer do grab, sem passar
+        # pelo ImageFormatConverter (o pypylon só expõe o Convert que aloca
+        # uma imagem nova a cada frame). Valor: (código cvtColor, bits)
+        pylon = self._pylon
+        conversions = {
+            pylon.PixelType_RGB8packed: (cv2.COLOR_RGB2BGR, 8),
+        }
+        bayer_codes = {
+            "RG": cv2.COLOR_BayerRGGB2BGR,
+            "BG": cv2.COLOR_BayerBGGR2BGR,
+            "GR": cv2.COLOR_BayerGRBG2BGR,
+            "GB": cv2.COLOR_BayerGBRG2BGR,
+        }
+        for bits in (8, 10, 12, 16):
+            conversions[getattr(pylon, f"PixelType_Mono{bits}")] = (
+                cv2.COLOR_GRAY2BGR,
+                bits,
+            )
+            for pattern, code in bayer_codes.items():
+                conversions[getattr(pylon, f"PixelType_Bayer{pattern}{bits}")] = (
+                    code,
+                    bits,
+                )
+        return conversions
+
+    def _reduce_depth(self, raw, bits):
+        # Formatos de 10-16 bits (não packed) chegam como uint16: reduz para
+        # 8 bits num buffer intermediário reutilizado, alinhando pelo MSB
+        buf = self._depth_buffer
+        if buf is None or buf.shape != raw.shape:
+            buf = np.empty(raw.shape, np.uint8)
+            self._depth_buffer = buf
+            self._pool.record_allocation(buf.nbytes)
+        cv2.convertScaleAbs(raw, dst=buf, alpha=1.0 / (1 << (bits - 8)))
+        return buf
+
     def start_capture(self):
-        from capture import GRAB_STRATEGY
+        if self._camera.IsGrabbing():
+            return
 
-        grab_strategy = getattr(self._pylon, f"GrabStrategy_{GRAB_STRATEGY}")
-        self._camera.StartGrabbing(grab_strategy)
+        self._camera.MaxNumBuffer.SetValue(self._settings.grab_buffer_count)
+        self._grab_stats.reset_sequence()
+        grab_strategy = getattr(
+            self._pylon, f"GrabStrategy_{self._settings.grab_strategy}"
+        )
 
-    def capture_frame(self):
-        from capture import TIMEOUT_MS
+        if self._settings.grab_mode == "event":
+            # O pylon roda o loop de grab numa thread própria e entrega cada
+            # frame ao handler assim que ele chega
+            self._event_handler = self._create_event_handler()
+            self._camera.RegisterImageEventHandler(
+                self._event_handler,
+                self._pylon.RegistrationMode_ReplaceAll,
+                self._pylon.Cleanup_None,
+            )
+            self._camera.StartGrabbing(
+                grab_strategy, self._pylon.GrabLoop_ProvidedByInstantCamera
+            )
+        else:
+            self._camera.StartGrabbing(grab_strategy)
+
+    def _create_event_handler(self):
+        source = self
+
+        class FrameEventHandler(self._pylon.ImageEventHandler):
+            def OnImageGrabbed(self, camera, result):
+                try:
+                    source._on_image_grabbed(result)
+                except Exception as e:
+                    print(f"Erro na captura: {e}")
+
+        return FrameEventHandler()
+
+    def _on_image_grabbed(self, result):
+        self._grab_stats.record_result(result)
+        listener = self._frame_listener
+        if listener is None or not result.GrabSucceeded():
+            return
+        listener(self._convert(result))
+
+    def supports_push(self):
+        return self._event_handler is not None
+
+    def set_frame_listener(self, listener):
+        self._frame_listener = listener
 
-        if not self._camera.IsGrabbing():
+    def capture_frame(self):
+        if not self._camera.IsGrabbing() or self._event_handler is not None:
             return None
 
-        result = self._camera.RetrieveResult(
-            TIMEOUT_MS, self._pylon.TimeoutHandling_ThrowException
-        )
+        # Timeout não é erro: apenas não houve frame nesse intervalo
+        try:
+            result = self._camera.RetrieveResult(
+                self._settings.timeout_ms, self._pylon.TimeoutHandling_Return
+            )
+        except Exception:
+            self._grab_stats.record_failure()
+            raise
+
+        if not result.IsValid():
+            self._grab_stats.record_timeout()
+            return None
 
-        if not result.GrabSucceeded():
+        try:
+            self._grab_stats.record_result(result)
+            if not result.GrabSucceeded():
+                return None
+            return self._convert(result)
+        finally:
             result.Release()
-            return None
 
-        img = self._converter.Convert(result).Array
-        result.Release()
+    def _convert(self, result):
+        pixel_type = result.GetPixelType()
+        shape = (result.GetHeight(), result.GetWidth(), 3)
+
+        if pixel_type in self._cv_conversions:
+            code, bits = self._cv_conversions[pixel_type]
+            img = self._pool.acquire(shape)
+            with result.GetArrayZeroCopy() as raw:
+                src = raw if bits == 8 else self._reduce_depth(raw, bits)
+                cv2.cvtColor(src, code, dst=img)
+                del raw, src
+            return img
+
+        if pixel_type == self._pylon.PixelType_BGR8packed:
+            img = self._pool.acquire(shape)
+            with result.GetArrayZeroCopy() as raw:
+                img[...] = raw
+                del raw
+            self._pool.record_copy(img.nbytes)
+            return img
+
+        # Formatos packed (Mono12p, BayerRG12p...) continuam no conversor do
+        # pylon, que aloca uma imagem por frame; a alocação entra nas stats
+        converted = self._converter.Convert(result)
+        img = self._pool.acquire(shape)
+        with converted.GetArrayZeroCopy() as arr:
+            img[...] = arr
+            del arr
+        converted.Release()
+        self._pool.record_allocation(img.nbytes)
+        self._pool.record_copy(img.nbytes)
         return img
 
     def is_available(self):
         return self._camera.IsOpen() and self._camera.IsGrabbing()
 
+    def get_grab_stats(self):
+        return self._grab_stats.get_stats()
+
+    def needs_reconnect(self):
+        return (
+            not self.is_available()
+            or self._camera.IsCameraDeviceRemoved()
+            or self._grab_stats.get_consecutive_failures()
+            >= self._settings.reconnect_after_failures
+        )
+
+    def reconnect(self):
+        # Mantém o listener: o stream continua publicando no mesmo fan-out
+        self._release_camera()
+        self._camera = self._create_camera()
+        self.start_capture()
+        return self.is_available()
+
+    def _release_camera(self):
+        try:
+            if self._camera.IsGrabbing():
+                self._camera.StopGrabbing()
+            if self._event_handler is not None:
+                self._camera.DeregisterImageEventHandler(self._event_handler)
+                self._event_handler = None
+            if self._camera.IsOpen():
+                self._camera.Close()
+        finally:
+            # Com a câmera removida do barramento o device precisa ser destruído
+            # para que o pylon aceite abrir de novo o mesmo número de série
+            self._camera.DestroyDevice()
+
     def close(self):
         self._running = False
-        if self._camera.IsGrabbing():
-            self._camera.StopGrabbing()
-        if self._camera.IsOpen():
-            self._camera.Close()
+        self._frame_listener = None
+        self._release_camera()
 
 
 class VideoFileSource(VideoSource):
@@ -119,12 +376,23 @@ class VideoFileSource(VideoSource):
         self._cap = None
         self._frame_rate = 30.0
         self._last_frame_time = 0
+        self._frame_shape = (0, 0, 3)
         self._lock = threading.Lock()
 
     def start_capture(self):
         self._cap = cv2.VideoCapture(self._video_path)
         if self._cap.isOpened():
             self._frame_rate = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+            self._frame_shape = (
+                int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                3,
+            )
+
+    def _next_buffer(self):
+        if not all(self._frame_shape):
+            return None
+        return self._pool.acquire(self._frame_shape)
 
     def capture_frame(self):
         if not self.is_available():
@@ -137,12 +405,13 @@ class VideoFileSource(VideoSource):
             if current_time - self._last_frame_time < frame_interval:
                 time.sleep(frame_interval - (current_time - self._last_frame_time))
 
-            ret, frame = self._cap.read()
+            # Decodifica direto num buffer do pool em vez de alocar um novo
+            ret, frame = self._cap.read(self._next_buffer())
 
             if not ret:
                 # Reinicia o vídeo para loop
                 self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                ret, frame = self._cap.read()
+                ret, frame = self._cap.read(self._next_buffer())
 
             self._last_frame_time = time.time()
             return frame if ret else None
@@ -150,6 +419,13 @@ class VideoFileSource(VideoSource):
     def is_available(self):
         return self._cap is not None and self._cap.isOpened()
 
+    def reconnect(self):
+        with self._lock:
+            if self._cap:
+                self._cap.release()
+            self.start_capture()
+        return self.is_available()
+
     def close(self):
         self._running = False
         if self._cap:
@@ -158,8 +434,8 @@ class VideoFileSource(VideoSource):
 
 class VideoSourceFactory:
     @staticmethod
-    def create_source():
-        uploaded_video_path = "/Users/alexandrealvaro/dev/estudio/basler-camera-streamer/uploads/current_video.mp4"
+    def create_source(settings):
+        uploaded_video_path = settings.uploaded_video_path
 
         # Primeiro tenta usar vídeo uploadado
         if os.path.exists(uploaded_video_path):
@@ -175,9 +451,26 @@ class VideoSourceFactory:
 
         # Caso contrário tenta usar câmera Basler
         try:
-            source = BaslerCameraSource()
+            source = BaslerCameraSource(settings)
             source.start_capture()
             return source
-        except (ImportError, RuntimeError) as e:
+        except Exception as e:
             print(f"Basler camera not available: {e}")
             return None
+
+    @staticmethod
+    def create_from_spec(settings, spec):
+        # "camera:<serial>" abre uma câmera Basler específica; qualquer outro
+        # valor é tratado como caminho de arquivo de vídeo
+        try:
+            if spec.startswith("camera:"):
+                source = BaslerCameraSource(settings, spec.split(":", 1)[1])
+            else:
+                source = VideoFileSource(spec)
+            source.start_capture()
+            if source.is_available():
+                return source
+            print(f"Source {spec} failed to load")
+        except Exception as e:
+            print(f"Source {spec} not available: {e}")
+        return None